@@ -1,9 +1,23 @@
 import sys
 from math import atan2
-from board import Board
+from board import Board, board_mask, explosion_masks, start_position, popcount
+from evaluation import material, square_scores, generate_square_scores
+from transposition import TranspositionTable, SharedTranspositionTable, TranspositionCache, default_cache_path, EXACT, LOWER_BOUND, UPPER_BOUND
+from time_manager import TimeManager, TimesUpException, clock
+from search_statistics import SearchStatistics
+from match_results import MatchResults
+from opening_book import OpeningBook, write_book
+from tablebase import Tablebases, get_signature_and_index, get_parent_outcome, is_better_outcome, get_table_size, get_tablebase_path, write_tablebase, generate_placements
+from move_encoding import encode_move, decode_move, get_move_piece, get_move_from, get_move_to, piece_codes, CAPTURE, EXPLOSION, NO_MOVE
 import operator
-import datetime
-from copy import deepcopy
+import multiprocessing
+import random
+import json
+import copy
+import collections
+import threading
+import itertools
+import os
 
 # All generated moves in generate_all_moves() function.
 moves = {
@@ -16,6 +30,28 @@ moves = {
     'K': [[[] for _ in range(9)] for _ in range(64)]
 }
 
+# Bitboard masks built from the moves table in generate_all_masks() function.
+# ray_masks[<piece>][<starting index>][<direction>] has a bit set for every index in moves[<piece>][<starting index>][<direction>].
+ray_masks = dict((piece, [[0 for _ in range(9)] for _ in range(64)]) for piece in moves)
+
+# attack_masks[<piece>][<starting index>] is every direction of ray_masks[<piece>][<starting index>] combined.
+attack_masks = dict((piece, [0 for _ in range(64)]) for piece in moves)
+
+# Pawns can only move straight onto an empty square and can only capture diagonally.
+pawn_push_masks = {'p': [0 for _ in range(64)], 'P': [0 for _ in range(64)]}
+pawn_capture_masks = {'p': [0 for _ in range(64)], 'P': [0 for _ in range(64)]}
+
+# Every index on a row ahead of the starting index, for the human ('h') and the computer ('c').
+# Bishops, rooks and knights can only move onto an empty square if it's ahead of them.
+forward_masks = {'h': [0 for _ in range(64)], 'c': [0 for _ in range(64)]}
+
+# Direction index of every move in the moves table, regardless of piece.
+# move_directions[<starting index>][<ending index>] is None if no piece can ever make that move.
+move_directions = [[None for _ in range(63)] for _ in range(63)]
+
+# Pieces of the human ('h') and the computer ('c').
+side_pieces = {'h': 'bnrpk', 'c': 'BNRPK'}
+
 # All pieces and their initial legal move logic.
 pieces = {
     'b': lambda x_move, y_move: abs(x_move) == abs(y_move),
@@ -57,91 +93,64 @@ directions = [
     atan2(-1,2),    # Knight NorthWest Vertical
 ]
 
-# Material scores for the evaluation function.
-# This determines the weight for each peice.
-material = {
-    'p': 100,
-    'n': 300,
-    'b': 300,
-    'r': 500,
-    'k': 20000
-}
-
-# Piece square table scores for the evaluation function.
-# This determines the score of a piece at in a certain location.
-piece_square_tables = {
-    'p':
-        [
-            [  0,  0,   0,  0,   0,  0,  0], 
-            [  0,  0,   0,  0,   0,  0,  0], 
-            [  0,  0,   0,  0,   0,  0,  0], 
-            [-10,  0, -10,  0, -10,  0,-10], 
-            [  5, 10,  20, 20,  20, 20,  5], 
-            [ 10, 20,  20, 20,  20, 20, 10], 
-            [  0,  0,   0,  0,   0,  0,  0], 
-            [  0,  0,   0,  0,   0,  0,  0], 
-            [  0,  0,   0,  0,   0,  0,  0], 
-        ],
-    'n':
-        [
-            [-50, -40, -30, -30, -30, -40, -50],
-            [-40, -20,   0,   0,   0, -20, -40],
-            [-30,  10,  10,  15,  10,  10, -30],
-            [-30,  10,  40,  40,  40,  10, -30],
-            [-30,  10,  40,  40,  40,  10, -30],
-            [-30,  10,  40,  40,  40,  10, -30],
-            [-30,  10,  10,  10,  10,  10, -30],
-            [-40, -20,   0,   0,   0, -20, -40], 
-            [-50, -40, -30, -30, -30, -40, -50], 
-        ],
-    'b':
-        [
-            [-20, -10, -10, -10, -10, -10, -20],
-            [-10,   0,   0,   0,   0,   0, -10],
-            [-10,   0,  10,  20,  10,   0, -10],
-            [-10,  10,  10,  20,  10,  10, -10],
-            [-10,  10,  20,  20,  20,  10, -10],
-            [-10,   0,  20,  20,  20,   0, -10],
-            [-10,  20,  20,  20,  20,  20, -10],
-            [-10,  10,   0,   0,   0,  10, -10],
-            [-20, -10, -10, -10, -10, -10, -20],
-        ],
-    'r':
-        [
-            [ 0,  0,  0,  0,  0,  0,  0],
-            [-5,  0,  0,  0,  0,  0, -5],
-            [-5,  0,  0,  0,  0,  0, -5],
-            [-5,  0,  0,  0,  0,  0, -5],
-            [-5,  0,  0,  0,  0,  0, -5],
-            [-5,  0,  0,  0,  0,  0, -5],
-            [-5, 10, 10, 10, 10, 10, -5],
-            [ 5, 20, 20, 20, 20, 20,  5],
-            [ 0,  0,  0,  0,  0,  0,  0],
-        ],
-    'k':
-        [
-            [ 20,  30,  30,  40,  30,  30,  20],
-            [ 20,  20,  30,  30,  30,  20,  20],
-            [ -5, -15, -15, -20, -15, -15,  -5],
-            [-10, -20, -20, -30, -20, -20, -10],
-            [-20, -30, -30, -40, -30, -30, -20],
-            [-30, -40, -40, -50, -40, -40,   0],
-            [-30, -40, -40, -50, -40, -40,   0],
-            [-30, -40, -40, -50, -40, -40,   0],
-            [-30, -40, -40, -50, -40, -40,   0]
-        ]
-}
+# Makes the worker and helper processes. They get the move tables, the shared transposition table and the
+# search settings of the process that starts them by being forked from it, so they're always forked, even
+# where processes are spawned by default (macOS, and Linux from Python 3.14 on). Python 2 always forks.
+process_context = multiprocessing.get_context('fork') if hasattr(multiprocessing, 'get_context') else multiprocessing
 
 # This table remembers board states and their evaluations.
 # This table prevents re-evaluating board states.
-transposition_table = {}
+transposition_table = TranspositionTable()
 
-# This killer moves table remembers the two last moves that produce 
-# alpha-beta cutoffs at each depth..
-killer_moves = {
-    # depth:
-        # [hashed_move_key1...hashed_move_keyn]
-}
+# Transposition table kept in a file across games and shared with other bots, see TranspositionCache. None if it's off.
+transposition_cache = None
+
+# Only board states searched at least this deep get saved to the transposition cache or looked up in it.
+# The shallow ones are quicker to search again than to look up.
+cache_min_depth = 2
+
+# Opening book the game and the engine protocol play from, see run_book(). Empty until it's built.
+opening_book = OpeningBook()
+
+# Endgame tablebases the search probes, see run_tablebase(). Empty until they're built.
+tablebases = Tablebases()
+
+# Evaluation of a board state the tablebases say is won, less a point per ply it takes from the root of the search.
+# More than any material but the kings' is worth.
+tablebase_win_score = 15000
+
+# Bigger than any evaluation.
+infinity = float('inf')
+
+# Half width of the aspiration window, around the last iteration's evaluation.
+aspiration_window = 50
+
+# Quiescence search skips captures and explosions that can't bring the evaluation
+# back within this margin of alpha (or beta), even after winning their material.
+delta_margin = 200
+
+# This table remembers the principal variation found under each depth.
+# pv_table[<depth>] is the best line of moves found so far from the board state being searched at that depth.
+pv_table = {}
+
+# Deepest ply the killer moves table has slots for.
+max_ply = 64
+
+# This killer moves table remembers the two last quiet moves that produced
+# alpha-beta cutoffs at each depth during this search.
+# killer_moves[<depth>] = [<newest killer move>, <older killer move>], NO_MOVE for an empty slot.
+killer_moves = [[NO_MOVE, NO_MOVE] for _ in range(max_ply)]
+
+# This history table scores quiet moves by how often they produced alpha-beta cutoffs,
+# weighing cutoffs deeper in the tree more. Halved at the start of every search, so old cutoffs fade.
+# history_table[<from index>][<to index>] = <score>
+history_table = [[0 for _ in range(63)] for _ in range(63)]
+
+# Statistics of the search running now, None when they're off. See instrument_search().
+search_statistics = None
+
+# MVV-LVA: captures of the most valuable victim go first, by the least valuable attacker first.
+attacker_ranks = {'p': 0, 'n': 1, 'b': 2, 'r': 3, 'k': 4}
 
 # Position mapping when giving to enemy bot. 
 inverted_position_mapping = {
@@ -210,32 +219,7 @@ inverted_position_mapping = {
     'g9': 'a1'
 }
 
-# Gets a nifty string hash key to remember moves quicker.
-def get_move_hash(piece, move_from, move_to):
-    return "{piece}{move_from}{move_to}".format(
-        piece=piece,
-        move_from=str(move_from[0])+str(move_from[1]),
-        move_to=str(move_to[0])+str(move_to[1])
-    )
-
-# Does the inverse of get_move_hash function.
-def unhash_move(move_hash):
-    return (move_hash[0], (int(move_hash[1]),int(move_hash[2])), (int(move_hash[3]),int(move_hash[4])))
-
-# Times a function. Used as decorator.
-def time_function(f):
-    def wrapper(*args, **kwargs):
-        start = datetime.datetime.now()
-        result = f(*args, **kwargs)
-        end = datetime.datetime.now()
-        seconds = (end-start).seconds
-        if seconds > 0:
-            print("{0} function took {1} seconds to finish.".format(f, (end-start).seconds))
-        return result
-    return wrapper
-
 # Generates all moves using directional rays.
-@time_function
 def generate_all_moves():
     """
     moves['q'][7][0] = [6, 5, 4, 3, 2, 1, 0]  # sorted by distance from idx = 7
@@ -288,10 +272,33 @@ def generate_all_moves():
                             # print("legal_move({0},{1}) = {2}".format(x_move,y_move,legal_move(x_move,y_move)))
 
                         moves[piece_name][start_index][direction_index].append(end_index)
+                        move_directions[start_index][end_index] = direction_index
+
+# Builds the bitboard masks from the moves generated in generate_all_moves() function.
+def generate_all_masks():
+    for piece_name, piece_moves in moves.items():
+        for start_index in range(63):
+            for direction_index, path in enumerate(piece_moves[start_index]):
+                ray_mask = 0
+                for end_index in path:
+                    ray_mask |= 1 << end_index
+                ray_masks[piece_name][start_index][direction_index] = ray_mask
+                attack_masks[piece_name][start_index] |= ray_mask
+
+    for start_index in range(63):
+        start_row = start_index // 7
+        start_col = start_index % 7
+        column_mask = sum(1 << index for index in range(start_col, 63, 7))
+        for pawn in ('p', 'P'):
+            pawn_push_masks[pawn][start_index] = attack_masks[pawn][start_index] & column_mask
+            pawn_capture_masks[pawn][start_index] = attack_masks[pawn][start_index] & ~column_mask
+
+        # The human moves up the board, the computer moves down.
+        forward_masks['h'][start_index] = (1 << (start_row*7)) - 1
+        forward_masks['c'][start_index] = board_mask & ~((1 << ((start_row+1)*7)) - 1)
 
 # @param move: A2 or D2
 # i.e. A is col 0, 2 is row 7.
-@time_function
 def convert_move_notation_to_board(move):
     # A == col 0
     # 2 == row 7
@@ -301,14 +308,29 @@ def convert_move_notation_to_board(move):
 
 # @param move: (0,2) or (1,3)
 # i.e. (0,7) = A2
-@time_function
 def convert_board_notation_to_move(move):
     x = str(9-move[0])
     y = chr(move[1]+97)
     return y+x
 
+# @param move: a move packed by encode_move().
+# i.e. b9c7, or b9b9 for an explosion.
+def convert_move_to_notation(move):
+    return convert_board_notation_to_move(divmod(get_move_from(move), 7)) + convert_board_notation_to_move(divmod(get_move_to(move), 7))
+
+# Packs the move of the piece on the start square to the end square, flagging a capture or an explosion.
+# @param start: (row, col) like convert_move_notation_to_board() returns.
+def create_move(board_object, start, end):
+    piece = board_object.board[start[0]][start[1]]
+    if start == end:
+        flags = EXPLOSION
+    elif board_object.board[end[0]][end[1]] != '-':
+        flags = CAPTURE
+    else:
+        flags = 0
+    return encode_move(piece, start[0]*7 + start[1], end[0]*7 + end[1], flags)
+
 # Checks all the legal move things that aren't included in the pieces dictionary.
-@time_function
 def is_legal_move(piece, all_moves, start, end, indexed_board, board, humans_turn):
     # Check if the location the player is trying to move is empty...
     if piece == '-':
@@ -336,10 +358,8 @@ def is_legal_move(piece, all_moves, start, end, indexed_board, board, humans_tur
     # print("start[0]: {0}, start[1]: {1}, end[0]: {2}, end[1]: {3}".format(start[0],start[1],end[0],end[1]))
     start_board_index = indexed_board[start[0]][start[1]]
     end_board_index = indexed_board[end[0]][end[1]]
-    direction = atan2(end[1]-start[1], end[0]-start[0])
-    if direction in directions:
-        direction_index = directions.index(direction) % 8
-    else:
+    direction_index = move_directions[start_board_index][end_board_index]
+    if direction_index is None:
         # print("{piece} doesn't know how to move in that direction.".format(piece=piece))
         return False
      
@@ -353,7 +373,7 @@ def is_legal_move(piece, all_moves, start, end, indexed_board, board, humans_tur
     
     move_piece = piece.lower() if piece not in ('P', 'K') else piece
     path = all_moves[move_piece][start_board_index][direction_index]
-    if end_board_index not in path:
+    if not (ray_masks[move_piece][start_board_index][direction_index] >> end_board_index) & 1:
         # print("{piece} doesn't know how to move to ({end_x},{end_y}).".format(piece=piece, end_x=end[0], end_y=end[1]))
         return False
 
@@ -412,51 +432,68 @@ def is_legal_move(piece, all_moves, start, end, indexed_board, board, humans_tur
 
     return True
 
-# Gets all the moves remaining on the board. This sucks, it's expensive.
-@time_function
-def get_all_remaining_moves(board, humans_turn, indexed_board, pieces_remaining):
-    all_remaining_moves = [] # [(piece, (from_x,from_y),(to_x,to_y))]
-    pieces_remaining_for_certain_player = filter(lambda p: p.islower() if humans_turn else p.isupper(), pieces_remaining)
-    for piece in pieces_remaining_for_certain_player:
-        # Go through each of the 63 moves for that piece. @TODO: Too much work. Fix this.
-        for move_from_index in range(63):
-            move_from_row = abs((7-(move_from_index+1))//7)
-            move_from_col = move_from_index%7
-
-            # If the piece isn't in the right position to make the move, skip this move index.
-            if board[move_from_row][move_from_col] == "-" or board[move_from_row][move_from_col] != piece:
-                continue
+# Gets all the moves remaining on the board.
+# @param tactical OPTIONAL: include captures and explosions that take at least one enemy piece with them.
+# @param quiet OPTIONAL: include every other move.
+def get_all_remaining_moves(board_object, humans_turn, tactical=True, quiet=True):
+    all_remaining_moves = [] # [<move packed by encode_move()>...]
+    side, enemy = ('h', 'c') if humans_turn else ('c', 'h')
+    enemy_occupied = board_object.occupied[enemy]
+    occupied = board_object.occupied[side] | enemy_occupied
+    empty = board_mask & ~occupied
+    # Leaving a kind of target out of these masks leaves those moves out.
+    capture_targets = enemy_occupied if tactical else 0
+    quiet_targets = empty if quiet else 0
+    for piece in side_pieces[side]:
+        move_piece = piece.lower() if piece not in ('P', 'K') else piece
+        piece_code = piece_codes[piece]
+        pieces_left = board_object.bitboards[piece]
+        while pieces_left:
+            piece_bit = pieces_left & -pieces_left
+            pieces_left ^= piece_bit
+            move_from_index = piece_bit.bit_length() - 1
+            # The move with its to index and flags still left out.
+            move_base = piece_code | move_from_index
 
             # Add explosions to the moves!!!
-            all_remaining_moves.append((piece, (move_from_row, move_from_col), (move_from_row, move_from_col)))
-
-            move_piece = piece.lower() if piece not in ('P', 'K') else piece
-            # Go through every direction, if there is at least 1 good direction, then you know there still might be a legal move.
-            for direction in range(len(moves[move_piece][move_from_index])):
-                for move_to_index in moves[move_piece][move_from_index][direction]:
-                    move_to_row = abs((7-(move_to_index+1))//7)
-                    move_to_col = move_to_index%7
-                    if is_legal_move(piece, moves, (move_from_row,move_from_col), (move_to_row,move_to_col), indexed_board, board, humans_turn):
-                        all_remaining_moves.append(
-                            (piece, (move_from_row,move_from_col),(move_to_row,move_to_col))
-                        )
+            if explosions[piece.lower()]:
+                if (tactical if explosion_masks[move_from_index] & enemy_occupied else quiet):
+                    all_remaining_moves.append(move_base | move_from_index << 6 | EXPLOSION)
+
+            if move_piece in ('b', 'r'):
+                # Walk every ray until the first piece in the way.
+                # Moving backwards or sideways is only allowed when capturing.
+                forward = forward_masks[side][move_from_index] & quiet_targets
+                for path in moves[move_piece][move_from_index]:
+                    for move_to_index in path:
+                        move_to_bit = 1 << move_to_index
+                        if occupied & move_to_bit:
+                            if capture_targets & move_to_bit:
+                                all_remaining_moves.append(move_base | move_to_index << 6 | CAPTURE)
+                            break
+                        if forward & move_to_bit:
+                            all_remaining_moves.append(move_base | move_to_index << 6)
+                continue
+
+            if move_piece in ('p', 'P'):
+                targets = (pawn_push_masks[move_piece][move_from_index] & quiet_targets) | (pawn_capture_masks[move_piece][move_from_index] & capture_targets)
+            else:
+                attacks = attack_masks[move_piece][move_from_index]
+                # Moving backwards is only allowed when capturing.
+                targets = (attacks & quiet_targets & forward_masks[side][move_from_index]) | (attacks & capture_targets)
+
+            while targets:
+                target_bit = targets & -targets
+                targets ^= target_bit
+                all_remaining_moves.append(move_base | (target_bit.bit_length() - 1) << 6 | (CAPTURE if target_bit & enemy_occupied else 0))
     return all_remaining_moves
 
 # Checks to see if the game is over.
 # Returns tuple like (is_game_over, winner).
-@time_function
-def is_game_over(board, humans_turn, indexed_board, pieces_remaining):
+def is_game_over(board_object, humans_turn):
     # Check to see if there's at least one king dead. 
     # If at least one king is dead, then the game's over.
-    kings_alive = []
-    for row in board:
-        if 'k' in row:
-            kings_alive.append('k')
-        if 'K' in row:
-            kings_alive.append('K')
-
-        if len(kings_alive) >= 2:
-            break
+    kings_alive = [king for king in ('k', 'K') if board_object.bitboards[king]]
 
     # When explosion kills both kings,
     # the player committing the explosion loses.
@@ -473,87 +510,360 @@ def is_game_over(board, humans_turn, indexed_board, pieces_remaining):
 
     # Check if there are still legal moves.
     # Only check pieces that are still on the board, but player that's making the move.
-    pieces_remaining_for_certain_player = filter(lambda p: p.islower() if humans_turn else p.isupper(), pieces_remaining)
-    for piece in pieces_remaining_for_certain_player:
-        # Go through each of the 63 moves for that piece. @TODO: Too much work. Fix this.
-        for move_from_index in range(63):
-            move_from_row = abs((7-(move_from_index+1))//7)
-            move_from_col = move_from_index%7
-
-            # If the piece isn't in the right position to make the move, skip this move index.
-            if board[move_from_row][move_from_col] == "-" or board[move_from_row][move_from_col] != piece:
-                continue
-
-            move_piece = piece.lower() if piece not in ('P', 'K') else piece
-            # Go through every direction, if there is at least 1 good direction, then you know there's still a legal move.
-            for direction in range(len(moves[move_piece][move_from_index])):
-                for move_to_index in moves[move_piece][move_from_index][direction]:
-                    move_to_row = abs((7-(move_to_index+1))//7)
-                    move_to_col = move_to_index%7
-                    if is_legal_move(piece, moves, (move_from_row,move_from_col), (move_to_row,move_to_col), indexed_board, board, humans_turn):
-                        return (False, None)
+    # Explosions don't count.
+    for move in get_all_remaining_moves(board_object, humans_turn):
+        if not move & EXPLOSION:
+            return (False, None)
     return (True, 'h' if humans_turn else 'c')
 
     # THIS WILL GO AWAY WHEN THE ABOVE PSUEDO CODE FOR LEGAL MOVES IS DONE!!!
     # return (False, None)
 
-class TimesUpException(Exception):
-    def __init__(self):
-        print("TIMES UP.")
+# Start of minimax function.
+# Iterative deepening: searches depth 2, then 3, and so on until the time is up.
+# Every iteration searches the root moves best first according to the last iteration,
+# follows the last iteration's principal variation first, and starts with a narrow
+# aspiration window around the last iteration's evaluation.
+# @param time_manager OPTIONAL: TimeManager with the budget for this move. 5 seconds if None.
+# @param workers OPTIONAL: number of processes to split the root moves between.
+# @param helpers OPTIONAL: number of Lazy SMP helper processes searching the same board state alongside.
+# @param report OPTIONAL: called like report(<depth>, <evaluation>, <principal variation>) after every finished iteration.
+# @param statistics OPTIONAL: SearchStatistics to fill in about this search. With workers or helpers, only the main process counts,
+# but the nodes the workers searched.
+def minimax_start(board_object, max_depth, humans_turn, verbose=False, time_manager=None, workers=1, helpers=0, report=None, statistics=None, book=None):
+    if time_manager is None:
+        time_manager = TimeManager()
+    time_manager.start()
+
+    if book is not None:
+        book_entry = book.probe(board_object.get_state_hash(humans_turn))
+        # Hash collisions are possible, so the move has to be one of the moves here.
+        if book_entry is not None and book_entry[0] in get_all_remaining_moves(board_object, humans_turn):
+            if verbose:
+                print("minimax_start || book move: {move}, eval={eval}.".format(move=convert_move_to_notation(book_entry[0]), eval=book_entry[1]))
+            return book_entry
+
+    if helpers > 0:
+        share_transposition_table()
+    transposition_table.new_search()
+    reset_move_ordering()
+
+    if statistics is not None:
+        plain_functions = instrument_search(statistics)
+    helper_processes = start_helpers(board_object, max_depth, humans_turn, time_manager, helpers)
+    try:
+        if workers > 1:
+            return parallel_minimax_start(board_object, max_depth, humans_turn, verbose, time_manager, workers, report)
+        return serial_minimax_start(board_object, max_depth, humans_turn, verbose, time_manager, report)
+    finally:
+        stop_helpers(helper_processes)
+        if transposition_cache is not None:
+            saved_entries = transposition_cache.save(transposition_table, cache_min_depth)
+            if verbose:
+                print("minimax_start || transposition cache probes: {probes}, hits: {hits}, entries saved: {saved_entries}.".format(probes=transposition_cache.probes, hits=transposition_cache.hits, saved_entries=saved_entries))
+        if statistics is not None:
+            uninstrument_search(plain_functions)
+            statistics.finish(time_manager, transposition_table)
+        # With workers, the probes happen in the worker processes.
+        if verbose and helpers > 0 and workers <= 1:
+            print("minimax_start || transposition table probes: {probes}, hits: {hits}, hits on entries from helpers: {shared_hits}.".format(probes=transposition_table.probes, hits=transposition_table.hits, shared_hits=transposition_table.get_shared_hits()))
+
+# Turns the search statistics on, by swapping the functions the search calls for instrumented ones.
+# Returns the plain functions, to give to uninstrument_search() when the search is over.
+def instrument_search(statistics):
+    global search_statistics, get_all_remaining_moves, evaluate, quiescence, pick_moves
+    plain_functions = (get_all_remaining_moves, evaluate, quiescence, pick_moves)
+    search_statistics = statistics
+    get_all_remaining_moves = statistics.time_calls(get_all_remaining_moves, 'movegen')
+    evaluate = statistics.time_calls(evaluate, 'evaluation')
+    quiescence = statistics.count_qnodes(quiescence)
+    pick_moves = statistics.count_picked_moves(pick_moves)
+    return plain_functions
+
+# Turns the search statistics off again.
+def uninstrument_search(plain_functions):
+    global search_statistics, get_all_remaining_moves, evaluate, quiescence, pick_moves
+    get_all_remaining_moves, evaluate, quiescence, pick_moves = plain_functions
+    search_statistics = None
+
+# Single process search of minimax_start().
+def serial_minimax_start(board_object, max_depth, humans_turn, verbose, time_manager, report):
+    remaining_moves = order_moves(board_object, humans_turn, get_all_remaining_moves(board_object, humans_turn))
+    if not remaining_moves:
+        return (None, None)
+
+    # Best move of the last finished iteration. Until one finishes, the best guess from ordering.
+    best_move = remaining_moves[0]
+    best_move_value = None
+    principal_variation = []
+
+    # Evaluations of the root moves in the last iteration, to order the next one.
+    move_values = {}
 
-# @param time_elapsed: timedelta
-def check_if_time_is_up(time_elapsed):
-    if time_elapsed.seconds >= 5:
-        raise TimesUpException()
+    for current_depth in range(2, max_depth+1):
+        if not time_manager.can_start_iteration(current_depth):
+            break
 
-# Start of minimax function.
-@time_function
-def minimax_start(board_object, max_depth, humans_turn, verbose=False):
-    remaining_moves = get_all_remaining_moves(board_object.board, humans_turn, board_object.indexed_board, board_object.get_pieces_remaining().keys())
-    
-    # Used just in case best moves aren't found.
-    last_move = None
-    last_move_value = None
+        if best_move_value is None:
+            alpha, beta = -infinity, infinity
+        else:
+            alpha, beta = best_move_value - aspiration_window, best_move_value + aspiration_window
+        window = aspiration_window
+
+        while True:
+            # Best move of this iteration. Only safe to play before the iteration finishes if
+            # it's the last iteration's best move, or if it beat that move's evaluation at this depth.
+            iteration_best_move = None
+            iteration_best_move_value = -infinity if not humans_turn else infinity
+            iteration_principal_variation = []
+            root_alpha, root_beta = alpha, beta
+
+            for move in remaining_moves:
+                board_object.make_move(move)
+                try:
+                    move_value = minimax(
+                        board_object,
+                        1,
+                        current_depth,
+                        not humans_turn,
+                        root_alpha,
+                        root_beta,
+                        time_manager,
+                        principal_variation[1:] if principal_variation and move == principal_variation[0] else None
+                    )
+                except TimesUpException:
+                    # This move's search didn't finish, so its evaluation can't be trusted.
+                    if iteration_best_move is not None and (iteration_best_move == best_move or ((iteration_best_move_value > alpha) if not humans_turn else (iteration_best_move_value < beta))):
+                        return (iteration_best_move, iteration_best_move_value)
+                    return (best_move, best_move_value)
+                finally:
+                    board_object.retract_move()
 
-    best_move_value = -9999
-    best_move = None
+                move_values[move] = move_value
+                if (move_value > iteration_best_move_value) if not humans_turn else (move_value < iteration_best_move_value):
+                    iteration_best_move_value = move_value
+                    iteration_best_move = move
+                    iteration_principal_variation = [move] + pv_table.get(1, [])
 
-    time_elapsed = datetime.timedelta(0)
-    # ITERATIVE DEEPENING || for current_depth in range(1, max_depth+1):
-    for current_depth in range(2, max_depth+1):
-        for piece, move_from, move_to in remaining_moves:
-            try:
-                check_if_time_is_up(time_elapsed)
-            except TimesUpException:
-                if best_move is None:
-                    return (last_move, last_move_value)
+                if not humans_turn:
+                    root_alpha = max(root_alpha, move_value)
                 else:
-                    return (best_move, best_move_value)
+                    root_beta = min(root_beta, move_value)
 
-            start_timestamp = datetime.datetime.now()
-            board_object.move(piece, move_from, move_to)
-            move_value = minimax(board_object, 1, current_depth, not humans_turn, -10000, 10000, time_elapsed)
-            board_object.retract_move()
+                if verbose:
+                    print("minimax_start || current_depth: {current_depth}, max_depth: {max_depth}, time_elapsed: {time_elapsed:.3f}s, {min_or_max}, {move}, eval={eval}.".format(current_depth=current_depth, max_depth=max_depth, time_elapsed=time_manager.get_elapsed(), min_or_max="min" if humans_turn else "max", move=convert_move_to_notation(move), eval=move_value))
+
+                if root_beta <= root_alpha: # If alpha-beta cutoff.
+                    break
 
-            if move_value > best_move_value:
-                best_move_value = move_value
-                best_move = (piece, move_from, move_to)
+            # Outside the aspiration window the evaluation is only a bound, so search again with a wider window.
+            # After a few tries, give up on the window.
+            if iteration_best_move_value <= alpha and alpha > -infinity:
+                alpha = alpha - window if window < aspiration_window*16 else -infinity
+            elif iteration_best_move_value >= beta and beta < infinity:
+                beta = beta + window if window < aspiration_window*16 else infinity
+            else:
+                break
+            window *= 4
+            if verbose:
+                print("minimax_start || current_depth: {current_depth}, eval={eval} is outside the aspiration window, searching again.".format(current_depth=current_depth, eval=iteration_best_move_value))
+
+        best_move = iteration_best_move
+        best_move_value = iteration_best_move_value
+        principal_variation = iteration_principal_variation
 
-            last_move_value = move_value
-            last_move = (piece, move_from, move_to)
+        # The best move first, then the rest by their evaluations.
+        remaining_moves.sort(key=lambda move: move_values.get(move, -infinity if not humans_turn else infinity), reverse=not humans_turn)
+        remaining_moves.remove(best_move)
+        remaining_moves.insert(0, best_move)
+
+        if verbose:
+            print("minimax_start || current_depth: {current_depth} finished, eval={eval}, principal variation: {principal_variation}.".format(current_depth=current_depth, eval=best_move_value, principal_variation=" ".join(convert_move_to_notation(move) for move in principal_variation)))
+        if report is not None:
+            report(current_depth, best_move_value, principal_variation)
+
+    return (best_move, best_move_value)
+
+# Each worker process of parallel_minimax_start() keeps its own board, time manager and
+# the root evaluation shared by all workers, set up by initialize_root_worker().
+root_worker = {}
+
+def initialize_root_worker(board_object, time_manager, shared_root_value, workers):
+    root_worker['board_object'] = board_object
+    root_worker['time_manager'] = time_manager
+    root_worker['shared_root_value'] = shared_root_value
+    # A node budget is split between the workers.
+    if time_manager.node_limit is not None:
+        time_manager.node_limit = max(1, time_manager.node_limit // workers)
+        time_manager.schedule_poll()
+
+# Searches one root move in a worker process.
+# With full_window, the move is searched without the shared root evaluation narrowing the window, so its evaluation is exact.
+# Returns tuple like (move, evaluation, principal_variation, is_exact, nodes).
+# The evaluation is None if the time was up before the search finished.
+def search_root_move(task):
+    move, current_depth, humans_turn, principal_variation, full_window = task
+    board_object = root_worker['board_object']
+    time_manager = root_worker['time_manager']
+    shared_root_value = root_worker['shared_root_value']
+    if time_manager.is_time_up():
+        return (move, None, [], False, 0)
+    start_nodes = time_manager.nodes
+
+    # The best evaluation any worker found so far narrows the window.
+    if full_window:
+        alpha, beta = -infinity, infinity
+    elif not humans_turn:
+        alpha, beta = shared_root_value.value, infinity
+    else:
+        alpha, beta = -infinity, shared_root_value.value
+
+    board_object.make_move(move)
+    try:
+        move_value = minimax(board_object, 1, current_depth, not humans_turn, alpha, beta, time_manager, principal_variation)
+    except TimesUpException:
+        return (move, None, [], False, time_manager.nodes - start_nodes)
+    finally:
+        board_object.retract_move()
+
+    with shared_root_value.get_lock():
+        if (move_value > shared_root_value.value) if not humans_turn else (move_value < shared_root_value.value):
+            shared_root_value.value = move_value
+
+    # Inside the window the evaluation is exact, outside it's only a bound.
+    is_exact = alpha < move_value if not humans_turn else move_value < beta
+    return (move, move_value, [move] + pv_table.get(1, []), is_exact, time_manager.nodes - start_nodes)
+
+# Root-parallel version of minimax_start(). Every iteration hands the root moves out to a pool of
+# worker processes, each with its own copy of the board, move tables and transposition table.
+# The best root evaluation found so far is shared, so moves searched later get a narrower window.
+# Which moves get an exact evaluation depends on which worker finished first, so the moves whose bound
+# ties with the best exact evaluation are searched again with a full window. The best move is then the
+# best exact evaluation, ties going to the move first in the serial order, so the result doesn't depend
+# on the order the workers finished in.
+def parallel_minimax_start(board_object, max_depth, humans_turn, verbose, time_manager, workers, report):
+    remaining_moves = order_moves(board_object, humans_turn, get_all_remaining_moves(board_object, humans_turn))
+    if not remaining_moves:
+        return (None, None)
+
+    best_move = remaining_moves[0]
+    best_move_value = None
+    principal_variation = []
+
+    shared_root_value = process_context.Value('d', 0.0)
+    # The workers are forked here, so they start from this board state.
+    pool = process_context.Pool(workers, initialize_root_worker, (board_object, time_manager, shared_root_value, workers))
+    try:
+        for current_depth in range(2, max_depth+1):
+            if not time_manager.can_start_iteration(current_depth):
+                break
+
+            shared_root_value.value = -infinity if not humans_turn else infinity
+            tasks = [(move, current_depth, humans_turn, principal_variation[1:] if principal_variation and move == principal_variation[0] else None, False) for move in remaining_moves]
+            results = {}
+            while tasks:
+                for move, move_value, move_principal_variation, is_exact, nodes in pool.imap_unordered(search_root_move, tasks):
+                    results[move] = (move_value, move_principal_variation, is_exact)
+                    # The workers do all the searching, their nodes count for this search.
+                    time_manager.nodes += nodes
+                    if verbose and move_value is not None:
+                        print("parallel_minimax_start || current_depth: {current_depth}, max_depth: {max_depth}, time_elapsed: {time_elapsed:.3f}s, {min_or_max}, {move}, eval={eval}.".format(current_depth=current_depth, max_depth=max_depth, time_elapsed=time_manager.get_elapsed(), min_or_max="min" if humans_turn else "max", move=convert_move_to_notation(move), eval=move_value))
+
+                iteration_best_move = None
+                iteration_best_move_value = None
+                for move in remaining_moves:
+                    move_value, move_principal_variation, is_exact = results[move]
+                    if move_value is None or not is_exact:
+                        continue
+                    if iteration_best_move is None or ((move_value > iteration_best_move_value) if not humans_turn else (move_value < iteration_best_move_value)):
+                        iteration_best_move = move
+                        iteration_best_move_value = move_value
+                        iteration_principal_variation = move_principal_variation
+
+                # A bound no worse than the best exact evaluation might be a tie, or better, so it has to be exact too.
+                tasks = []
+                if iteration_best_move is not None:
+                    for move in remaining_moves:
+                        move_value, _, is_exact = results[move]
+                        if move_value is not None and not is_exact and ((move_value >= iteration_best_move_value) if not humans_turn else (move_value <= iteration_best_move_value)):
+                            tasks.append((move, current_depth, humans_turn, principal_variation[1:] if principal_variation and move == principal_variation[0] else None, True))
+
+            finished = all(results[move][0] is not None for move in remaining_moves)
+            # An unfinished iteration's best move is only safe if the last best move was searched to this depth too.
+            if iteration_best_move is not None and (finished or results[best_move][0] is not None):
+                best_move = iteration_best_move
+                best_move_value = iteration_best_move_value
+                principal_variation = iteration_principal_variation
+            if not finished:
+                break
+
+            # The best move first, then the rest by their evaluations.
+            remaining_moves.sort(key=lambda move: results[move][0], reverse=not humans_turn)
+            remaining_moves.remove(best_move)
+            remaining_moves.insert(0, best_move)
 
-            time_elapsed += datetime.datetime.now()-start_timestamp
             if verbose:
-                print("minimax_start || current_depth: {current_depth}, max_depth: {max_depth}, time_elapsed: {time_elapsed}, {min_or_max}, {move_from}{move_to}, eval={eval}.".format(current_depth=current_depth, max_depth=max_depth, time_elapsed=time_elapsed, min_or_max="min" if humans_turn else "max", move_from=convert_board_notation_to_move(move_from), move_to=convert_board_notation_to_move(move_to), eval=move_value))
+                print("parallel_minimax_start || current_depth: {current_depth} finished, eval={eval}, principal variation: {principal_variation}.".format(current_depth=current_depth, eval=best_move_value, principal_variation=" ".join(convert_move_to_notation(move) for move in principal_variation)))
+            if report is not None:
+                report(current_depth, best_move_value, principal_variation)
+    finally:
+        pool.terminate()
+        pool.join()
 
     return (best_move, best_move_value)
 
+# Swaps the transposition table for one in shared memory, so processes forked from now on share it.
+def share_transposition_table():
+    global transposition_table
+    if not isinstance(transposition_table, SharedTranspositionTable):
+        transposition_table = SharedTranspositionTable()
+
+# Forks the Lazy SMP helpers of a search. They share the transposition table with the main search.
+# Returns list like [<process>...].
+def start_helpers(board_object, max_depth, humans_turn, time_manager, helpers):
+    helper_processes = []
+    for helper_number in range(1, helpers+1):
+        helper_process = process_context.Process(target=run_helper, args=(board_object, max_depth, humans_turn, time_manager, helper_number))
+        helper_process.daemon = True
+        helper_process.start()
+        helper_processes.append(helper_process)
+    return helper_processes
+
+# Stops the helpers once the main search made up its mind.
+def stop_helpers(helper_processes):
+    for helper_process in helper_processes:
+        helper_process.terminate()
+    for helper_process in helper_processes:
+        helper_process.join()
+
+# Lazy SMP helper, runs in its own process until the main search stops it.
+# It iteratively deepens the same board state with its own root move order, and every other helper
+# starts a ply deeper, so the helpers fill the transposition table with entries the main search hasn't got yet.
+def run_helper(board_object, max_depth, humans_turn, time_manager, helper_number):
+    transposition_table.writer = helper_number
+    remaining_moves = get_all_remaining_moves(board_object, humans_turn)
+    random.Random(helper_number).shuffle(remaining_moves)
+    try:
+        for current_depth in range(2 + helper_number % 2, max_depth+1):
+            alpha, beta = -infinity, infinity
+            for move in remaining_moves:
+                board_object.make_move(move)
+                try:
+                    move_value = minimax(board_object, 1, current_depth, not humans_turn, alpha, beta, time_manager)
+                finally:
+                    board_object.retract_move()
+                if not humans_turn:
+                    alpha = max(alpha, move_value)
+                else:
+                    beta = min(beta, move_value)
+    except TimesUpException:
+        pass
+
 # THIS FUNCTION RETURNS HOW VALUABLE THIS BOARD STATE IS TO 
 # THE CHESS BOT.
-@time_function
 def evaluate(board_object, humans_turn):
     # If board state is a game over... return eval!
-    # game_over,winner = is_game_over(board_object.board, humans_turn, board_object.indexed_board, board_object.pieces_remaining)
+    # game_over,winner = is_game_over(board_object, humans_turn)
     
     # if the game's over, the bot found a winning move on one side.
     # if game_over:
@@ -562,176 +872,1407 @@ def evaluate(board_object, humans_turn):
     #     else:
     #         return -9999
 
-    evaluation = 0
-    # Sum material.
-    piece_material_scores = {
-        'k': 0,
-        'r': 0,
-        'n': 0,
-        'b': 0,
-        'p': 0
-    }
+    # The board keeps its evaluation up to date as pieces move and explode.
+    return board_object.evaluation
 
-    items = board_object.get_pieces_remaining().items()
-    adjacency_score = 0
-    for piece,location in items:
-        if piece.isupper(): # it's the bot's piece, that's good!
-            piece_material_scores[piece.lower()] += 1 # material[piece.lower()]
+# Orders all remaining moves in order to find alpha beta cutoffs easier.
+# The moves with the best static score for the player moving go first.
+def order_moves(board_object, humans_turn, remaining_moves):
+    return [move for _, move in score_moves(board_object, humans_turn, remaining_moves)]
+
+# Scores moves without making them.
+# Returns list like [(<score>, <move>)...], best score for the player moving first.
+def score_moves(board_object, humans_turn, remaining_moves):
+    scored_moves = [(get_move_score(board_object, move, humans_turn), move) for move in remaining_moves]
+    scored_moves.sort(key=operator.itemgetter(0), reverse=True)
+    return scored_moves
+
+# Scores a move without making it, from the point of view of the player moving.
+# Negative scores are for captures and explosions that lose material.
+# Captures score by MVV-LVA. Only those where the attacker is worth more than its victim can lose
+# material, so only those pay for a static_exchange_evaluation().
+# Explosions score the material they win.
+# Other moves score by the history table, then by how much better the square they move to is.
+def get_move_score(board_object, move, humans_turn):
+    if move & EXPLOSION:
+        return static_exchange_evaluation(board_object, move, humans_turn) * 8
+    piece, move_from_index, move_to_index = decode_move(move)
+    if move & CAPTURE:
+        victim_material = material[board_object.board[move_to_index // 7][move_to_index % 7].lower()]
+        if material[piece.lower()] > victim_material:
+            material_gain = static_exchange_evaluation(board_object, move, humans_turn)
+            if material_gain < 0:
+                return material_gain * 8
+        return victim_material * 8 - attacker_ranks[piece.lower()]
+    square_score = square_scores[piece][move_to_index] - square_scores[piece][move_from_index]
+    return history_table[move_from_index][move_to_index] + (-square_score if humans_turn else square_score)
+
+# Remembers a quiet move that produced an alpha-beta cutoff, for ordering the moves of other board states.
+def remember_cutoff(depth, remaining_depth, move):
+    history_table[get_move_from(move)][get_move_to(move)] += remaining_depth * remaining_depth
+    if depth < max_ply:
+        slots = killer_moves[depth]
+        if slots[0] != move:
+            slots[1] = slots[0]
+            slots[0] = move
+
+# Call at the start of every search: forgets the killer moves, and ages the history table.
+def reset_move_ordering():
+    for slots in killer_moves:
+        slots[0] = slots[1] = NO_MOVE
+    for history_scores in history_table:
+        for index in range(63):
+            history_scores[index] //= 2
+
+# Checks that a move remembered from another search can be made on this board, capture flag included.
+def is_move_on_board(board_object, move, humans_turn):
+    piece, move_from_index, move_to_index = decode_move(move)
+    move_from = divmod(move_from_index, 7)
+    move_to = divmod(move_to_index, 7)
+    if board_object.board[move_from[0]][move_from[1]] != piece:
+        return False
+    if not move & EXPLOSION and bool(move & CAPTURE) != (board_object.board[move_to[0]][move_to[1]] != '-'):
+        return False
+    return is_legal_move(piece, moves, move_from, move_to, board_object.indexed_board, board_object.board, humans_turn)
+
+# Captures and explosions that take at least one enemy piece with them.
+def is_tactical_move(board_object, move, humans_turn):
+    if move & EXPLOSION:
+        return explosion_masks[get_move_from(move)] & board_object.occupied['c' if humans_turn else 'h'] != 0
+    return move & CAPTURE != 0
+
+# Yields the moves of a board state lazily, in stages, so an alpha-beta cutoff skips the work of the later stages:
+# 1. The best move remembered in the transposition table.
+# 2. Captures and explosions that take enemy pieces with them, and don't lose material doing it.
+# 3. Killer moves.
+# 4. Quiet moves.
+# 5. Captures and explosions that lose material.
+# @param prune_losing OPTIONAL: leave out stage 5, unless there's nothing else to play.
+def pick_moves(board_object, humans_turn, depth, best_move_hint=NO_MOVE, prune_losing=False):
+    if best_move_hint and is_move_on_board(board_object, best_move_hint, humans_turn):
+        yield best_move_hint
+    else:
+        best_move_hint = NO_MOVE
+    losing_moves = []
+
+    tactical_moves = get_all_remaining_moves(board_object, humans_turn, quiet=False)
+    for score, move in score_moves(board_object, humans_turn, tactical_moves):
+        if move == best_move_hint:
+            continue
+        if score < 0:
+            losing_moves.append(move)
+        else:
+            yield move
 
-            adjacency_score += len(board_object.get_pieces_adjacent_to(location, 'h'))
+    # Killer moves come from other board states, only keep the ones that are legal here.
+    top_killer_moves = []
+    if depth < max_ply:
+        for move in killer_moves[depth]:
+            if move == NO_MOVE or move == best_move_hint or move in top_killer_moves:
+                continue
+            if is_move_on_board(board_object, move, humans_turn) and not is_tactical_move(board_object, move, humans_turn):
+                top_killer_moves.append(move)
+                yield move
+
+    quiet_moves = get_all_remaining_moves(board_object, humans_turn, tactical=False)
+    for score, move in score_moves(board_object, humans_turn, quiet_moves):
+        if move == best_move_hint or move in top_killer_moves:
+            continue
+        # Explosions that take no enemy pieces with them only lose material.
+        if move & EXPLOSION:
+            losing_moves.append(move)
         else:
-            piece_material_scores[piece.lower()] -= 1 # material[piece.lower()]
-            adjacency_score -= len(board_object.get_pieces_adjacent_to(location, 'c'))
+            yield move
 
-        # Piece Square Table evaluation scores.
-        if piece.lower() in piece_square_tables.keys():
-            if piece.isupper():
-                evaluation += piece_square_tables[piece.lower()][location[0]][location[1]]
-            else:
-                evaluation -= [reverse_row for reverse_row in reversed(piece_square_tables[piece.lower()])][location[0]][location[1]]
+    if prune_losing and (best_move_hint or len(losing_moves) < len(tactical_moves) + len(quiet_moves)):
+        return
+    for move in losing_moves:
+        yield move
 
-    material_score = piece_material_scores['k']*material['k'] \
-        + piece_material_scores['r']*material['r'] \
-        + piece_material_scores['n']*material['n'] \
-        + piece_material_scores['b']*material['b'] \
-        + piece_material_scores['p']*material['p']
+# Recursive minimax function.
+# @param principal_variation OPTIONAL: the rest of the last iteration's principal variation, if this board state is on it.
+def minimax(board_object, depth, max_depth, humans_turn, alpha, beta, time_manager, principal_variation=None):
+    # Raises TimesUpException when the budget is used up. The moves made so far get retracted on the way out.
+    time_manager.check()
+    pv_table[depth] = []
+
+    # With few enough pieces left, the tablebases know how the game ends.
+    if tablebases.max_pieces and popcount(board_object.occupied['h'] | board_object.occupied['c']) <= tablebases.max_pieces:
+        outcome = tablebases.probe(board_object, humans_turn)
+        if outcome is not None:
+            return get_tablebase_score(outcome, humans_turn, depth)
+
+    # If board state has been searched at least this deep before, use its evaluation.
+    # Bounds from cut off searches can still narrow the alpha-beta window, or cut off this search too.
+    # If it hasn't been searched deep enough, its best move still gets searched first.
+    state_hash = board_object.get_state_hash(humans_turn)
+    remaining_depth = max_depth - depth
+    best_move_hint = NO_MOVE
+    previously_seen_state_info = transposition_table.probe(state_hash)
+    # Board states searched in earlier games, or by other bots, might be in the transposition cache,
+    # maybe deeper than this search got to so far. The deeper entry is the one to use.
+    if transposition_cache is not None and remaining_depth >= cache_min_depth and (previously_seen_state_info is None or previously_seen_state_info[1] < remaining_depth):
+        cached_state_info = transposition_cache.probe(state_hash)
+        if cached_state_info is not None and (previously_seen_state_info is None or cached_state_info[1] > previously_seen_state_info[1]):
+            previously_seen_state_info = cached_state_info
+    if previously_seen_state_info:
+        _, seen_depth, seen_flag, seen_evaluation, best_move_hint, _ = previously_seen_state_info
+        if seen_depth >= remaining_depth:
+            if seen_flag == LOWER_BOUND:
+                alpha = max(alpha, seen_evaluation)
+            elif seen_flag == UPPER_BOUND:
+                beta = min(beta, seen_evaluation)
+            if seen_flag == EXACT or beta <= alpha:
+                if search_statistics is not None:
+                    search_statistics.tt_cutoffs += 1
+                return seen_evaluation
 
-    evaluation += material_score
-    evaluation += adjacency_score
+    if depth == max_depth:
+        evaluation = quiescence(board_object, humans_turn, alpha, beta, time_manager)
+        if evaluation <= alpha:
+            flag = UPPER_BOUND
+        elif evaluation >= beta:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        transposition_table.store(state_hash, 0, flag, evaluation, NO_MOVE)
+        return evaluation
 
-    # Maximize Explosions...
-    # For each piece left, count how many of the opposing pieces are adjacent.
+    # The window this board state is searched with, to tell which bound the result is.
+    searched_alpha, searched_beta = alpha, beta
+    best_move = NO_MOVE
 
+    # The principal variation goes first, even if the transposition table forgot it.
+    if principal_variation:
+        best_move_hint = principal_variation[0]
+    # Right above the quiescence search, captures and explosions that lose material are left out.
+    ordered_remaining_moves = pick_moves(board_object, humans_turn, depth, best_move_hint, prune_losing=remaining_depth == 1)
 
+    # Starts from the worst evaluation there is, so even a forced loss has a best move, and its real evaluation.
+    if not humans_turn:
+        best_move_value = -infinity
+        for move in ordered_remaining_moves:
+            board_object.make_move(move)
+            try:
+                minimax_best_move_value = minimax(
+                    board_object, 
+                    depth+1, 
+                    max_depth, 
+                    not humans_turn,
+                    alpha, 
+                    beta,
+                    time_manager,
+                    principal_variation[1:] if principal_variation and move == principal_variation[0] else None
+                )
+            finally:
+                board_object.retract_move()
+            if best_move == NO_MOVE or minimax_best_move_value > best_move_value:
+                best_move_value = minimax_best_move_value
+                best_move = move
+                pv_table[depth] = [best_move] + pv_table.get(depth+1, [])
+            alpha = max(alpha, best_move_value)
 
-    return evaluation
+            if beta <= alpha: # If alpha-beta cutoff.
+                if not move & (CAPTURE | EXPLOSION):
+                    remember_cutoff(depth, remaining_depth, move)
+                if search_statistics is not None:
+                    search_statistics.count_cutoff(ordered_remaining_moves)
+                break
+    else:
+        best_move_value = infinity
+        for move in ordered_remaining_moves:
+            board_object.make_move(move)
+            try:
+                minimax_best_move_value = minimax(
+                    board_object, 
+                    depth+1, 
+                    max_depth, 
+                    not humans_turn, 
+                    alpha, 
+                    beta,
+                    time_manager,
+                    principal_variation[1:] if principal_variation and move == principal_variation[0] else None
+                )
+            finally:
+                board_object.retract_move()
+            if best_move == NO_MOVE or minimax_best_move_value < best_move_value:
+                best_move_value = minimax_best_move_value
+                best_move = move
+                pv_table[depth] = [best_move] + pv_table.get(depth+1, [])
+            beta = min(beta, best_move_value)
 
-# Orders all remaining moves in order to find alpha beta cutoffs easier.
-# This uses the killer moves technique.
-@time_function
-def order_moves(board_object, humans_turn, remaining_moves, depth):
-    move_evaluations = {}
-    for move in remaining_moves:
-        piece = move[0]
-        move_from = move[1]
-        move_to = move[2]    
-        board_object.move(piece, move_from, move_to)
-        move_evaluations[move] = evaluate(board_object, humans_turn)
-        board_object.retract_move()
-    move_evaluations_sorted = sorted(move_evaluations.items(), key=operator.itemgetter(1), reverse=True)
+            if beta <= alpha: # If alpha-beta cutoff.
+                if not move & (CAPTURE | EXPLOSION):
+                    remember_cutoff(depth, remaining_depth, move)
+                if search_statistics is not None:
+                    search_statistics.count_cutoff(ordered_remaining_moves)
+                break
+
+    # Without a single move, there's nothing to search, the board state is all there is.
+    if best_move == NO_MOVE:
+        best_move_value = evaluate(board_object, humans_turn)
+
+    if best_move_value <= searched_alpha:
+        flag = UPPER_BOUND
+    elif best_move_value >= searched_beta:
+        flag = LOWER_BOUND
+    else:
+        flag = EXACT
+    transposition_table.store(state_hash, remaining_depth, flag, best_move_value, best_move)
+
+    return best_move_value
+
+# Evaluation from the bot's point of view of a tablebase outcome for the player moving.
+# @param depth OPTIONAL: plies from the root of the search, so board states on different plies score the same game the same.
+def get_tablebase_score(outcome, humans_turn, depth=0):
+    if outcome > 0:
+        score = tablebase_win_score - outcome - depth
+    elif outcome < 0:
+        score = -(tablebase_win_score + outcome + 1 - depth)
+    else:
+        score = 0
+    return -score if humans_turn else score
+
+# Static exchange evaluation: the material the player moving wins with a capture or an explosion,
+# minus its own material lost, without making the move.
+# An explosion destroys everything in the 3x3 area around the exploding piece.
+# A capture is followed by the sequence of recaptures on the target square, cheapest attacker first,
+# where either player stops recapturing once that would lose material.
+def static_exchange_evaluation(board_object, move, humans_turn):
+    piece, move_from_index, target_index = decode_move(move)
+    if move & EXPLOSION:
+        # The exploding piece is one of the pieces adjacent to its own square.
+        material_gain = 0
+        for exploded_piece in board_object.get_pieces_adjacent_to(divmod(move_from_index, 7)):
+            if exploded_piece.islower() == humans_turn:
+                material_gain -= material[exploded_piece.lower()]
+            else:
+                material_gain += material[exploded_piece.lower()]
+        return material_gain
+
+    occupied = (board_object.occupied['h'] | board_object.occupied['c']) & ~(1 << move_from_index)
+    captured_piece = board_object.board[target_index // 7][target_index % 7]
+    # gains[<n>] is the material won by the player making the <n>th capture, if the sequence ended there.
+    gains = [material[captured_piece.lower()] if captured_piece != '-' else 0]
+    piece_on_target = piece
+    attacking_humans_turn = not humans_turn
+    # Capturing a king ends the game, and the sequence.
+    while captured_piece.lower() != 'k':
+        attacker = get_least_valuable_attacker(board_object, target_index, occupied, attacking_humans_turn)
+        if attacker is None:
+            break
+        attacker_bit, attacker_piece = attacker
+        gains.append(material[piece_on_target.lower()] - gains[-1])
+        captured_piece = piece_on_target
+        occupied ^= attacker_bit
+        piece_on_target = attacker_piece
+        attacking_humans_turn = not attacking_humans_turn
+
+    while len(gains) > 1:
+        gain = gains.pop()
+        gains[-1] = -max(-gains[-1], gain)
+    return gains[0]
+
+# Finds the cheapest piece of the player that can capture on the target square.
+# Pieces missing from occupied don't count, and don't block bishops and rooks.
+# Returns tuple like (<bit of the piece's square>, <piece>), or None.
+def get_least_valuable_attacker(board_object, target_index, occupied, humans_turn):
+    bitboards = board_object.bitboards
+    # A human pawn or king captures up the board, so it attacks the square from where
+    # a computer pawn or king on the target square could capture.
+    if humans_turn:
+        pawn, knight, bishop, rook, king = 'pnbrk'
+        pawn_attackers = pawn_capture_masks['P'][target_index]
+        king_attackers = attack_masks['K'][target_index]
+    else:
+        pawn, knight, bishop, rook, king = 'PNBRK'
+        pawn_attackers = pawn_capture_masks['p'][target_index]
+        king_attackers = attack_masks['k'][target_index]
+
+    attackers = pawn_attackers & bitboards[pawn] & occupied
+    if attackers:
+        return (attackers & -attackers, pawn)
+    attackers = attack_masks['n'][target_index] & bitboards[knight] & occupied
+    if attackers:
+        return (attackers & -attackers, knight)
+    # Bishops and rooks capture in any of their directions, so walk their rays out from the target square.
+    for slider in (bishop, rook):
+        sliders = bitboards[slider] & occupied
+        if not sliders:
+            continue
+        for path in moves[slider.lower()][target_index]:
+            for index in path:
+                bit = 1 << index
+                if occupied & bit:
+                    if sliders & bit:
+                        return (bit, slider)
+                    break
+    attackers = king_attackers & bitboards[king] & occupied
+    if attackers:
+        return (attackers & -attackers, king)
+    return None
+
+# Quiescence search, run where minimax runs out of depth.
+# Keeps searching captures and the explosions that destroy more enemy than own material
+# until the board state is quiet, so a piece about to be taken doesn't count as safe.
+# The player moving can always stand pat, i.e. keep the evaluation instead of taking anything.
+def quiescence(board_object, humans_turn, alpha, beta, time_manager):
+    time_manager.check()
+
+    stand_pat = evaluate(board_object, humans_turn)
+    # If a king is dead, the game's over.
+    if not board_object.bitboards['k'] or not board_object.bitboards['K']:
+        return stand_pat
+    if not humans_turn:
+        if stand_pat >= beta:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+    else:
+        if stand_pat <= alpha:
+            return stand_pat
+        beta = min(beta, stand_pat)
+
+    tactical_moves = []
+    for move in get_all_remaining_moves(board_object, humans_turn, quiet=False):
+        material_gain = static_exchange_evaluation(board_object, move, humans_turn)
+        # Only explosions that win material, and captures that don't lose it.
+        if material_gain < 0 or (move & EXPLOSION and material_gain == 0):
+            continue
+        # Delta pruning: even winning this material for free wouldn't reach alpha (or beta).
+        if (stand_pat + material_gain + delta_margin <= alpha) if not humans_turn else (stand_pat - material_gain - delta_margin >= beta):
+            continue
+        tactical_moves.append((material_gain, move))
+    # Biggest material gain first.
+    tactical_moves.sort(key=operator.itemgetter(0), reverse=True)
+
+    best_move_value = stand_pat
+    for _, move in tactical_moves:
+        board_object.make_move(move)
+        try:
+            move_value = quiescence(board_object, not humans_turn, alpha, beta, time_manager)
+        finally:
+            board_object.retract_move()
+        if not humans_turn:
+            best_move_value = max(best_move_value, move_value)
+            alpha = max(alpha, best_move_value)
+        else:
+            best_move_value = min(best_move_value, move_value)
+            beta = min(beta, best_move_value)
+        if beta <= alpha: # If alpha-beta cutoff.
+            break
 
-    # Put killer moves at the front!
-    killer_moves_on_depth = killer_moves.get(depth)
-    if killer_moves_on_depth:
-        if len(killer_moves_on_depth) > 0:
-            top_killer_moves = [unhash_move(killer_move) for killer_move in killer_moves[depth]]
-            return top_killer_moves + [move[0] for move in move_evaluations_sorted if move not in top_killer_moves]
+    return best_move_value
 
-    return [move[0] for move in move_evaluations_sorted]
+# Reads the command line, i.e. verbose movetime 2 or time 300 increment 2 or depth 6 or nodes 100000 or workers 16 or helpers 3 or stats or ponder
+# or cache [<file>], where 'cache' is the transposition cache file, None if there isn't one.
+# Returns dict like {'verbose': ..., 'time_manager': ..., 'workers': ..., 'helpers': ..., 'stats': ..., 'ponder': ..., 'cache': ...}.
+def parse_arguments(arguments):
+    verbose = False
+    stats = False
+    ponder = False
+    cache = None
+    workers = 1
+    helpers = 0
+    budget = {}
+    options = {
+        'movetime': ('movetime', float),
+        'time': ('time_left', float),
+        'increment': ('increment', float),
+        'movestogo': ('moves_to_go', int),
+        'depth': ('depth', int),
+        'nodes': ('nodes', int)
+    }
+    arguments = list(arguments)
+    while arguments:
+        argument = arguments.pop(0)
+        if argument == 'verbose':
+            verbose = True
+        elif argument == 'stats':
+            stats = True
+        elif argument == 'ponder':
+            ponder = True
+        elif argument == 'cache':
+            # The file is optional, anything that isn't another argument is the file.
+            if arguments and arguments[0] not in options and arguments[0] not in ('verbose', 'stats', 'ponder', 'cache', 'workers', 'helpers'):
+                cache = arguments.pop(0)
+            else:
+                cache = default_cache_path
+        elif argument == 'workers' and arguments:
+            workers = int(arguments.pop(0))
+        elif argument == 'helpers' and arguments:
+            helpers = int(arguments.pop(0))
+        elif argument in options and arguments:
+            name, convert = options[argument]
+            budget[name] = convert(arguments.pop(0))
+        else:
+            sys.exit("Unknown argument: {argument}".format(argument=argument))
+    return {
+        'verbose': verbose,
+        'time_manager': TimeManager(**budget),
+        'workers': workers,
+        'helpers': helpers,
+        'stats': stats,
+        'ponder': ponder,
+        'cache': cache
+    }
 
-# Recursive minimax function.
-def minimax(board_object, depth, max_depth, humans_turn, alpha, beta, time_elapsed):
-    start_timestamp = datetime.datetime.now()
+# Searches during the human's turn, on a copy of the board, so the bot isn't idle while the human thinks.
+# With an expected human move, searches the bot's answer to it. Without one, searches all of the human's
+# moves, which still fills the transposition table for the bot's search.
+# Returns dict like {'thread': ..., 'expected_move': ..., 'result': ...} to give to stop_pondering().
+def start_pondering(board_object, expected_move, time_manager):
+    ponder_board = copy.deepcopy(board_object)
+    humans_turn = True
+    if expected_move is not None:
+        ponder_board.make_move(expected_move)
+        humans_turn = False
+    ponder = {'expected_move': expected_move, 'result': None}
+
+    def search():
+        principal_variation = []
+        def report(depth, evaluation, iteration_principal_variation):
+            principal_variation[:] = iteration_principal_variation
+        best_move, best_move_value = minimax_start(ponder_board, 5000, humans_turn, time_manager=time_manager, report=report, book=opening_book)
+        ponder['result'] = (best_move, best_move_value, principal_variation)
+
+    time_manager.ponder()
+    ponder['thread'] = threading.Thread(target=search)
+    ponder['thread'].daemon = True
+    ponder['thread'].start()
+    return ponder
+
+# Call with the move the human played.
+# On a ponder hit, the pondering search goes on within the bot's budget, then its result gets returned:
+# tuple like (<best move>, <evaluation>, <principal variation>). Otherwise it's stopped and None gets returned,
+# though the transposition table keeps what it found.
+def stop_pondering(ponder, human_move, time_manager):
+    if human_move != ponder['expected_move']:
+        cancel_pondering(ponder, time_manager)
+        return None
+    time_manager.ponder_hit()
+    ponder['thread'].join()
+    time_manager.reset()
+    # The search might have died without a result.
+    if ponder['result'] is not None and ponder['result'][0] is not None:
+        return ponder['result']
+    return None
+
+# Stops the pondering search and waits for it, i.e. when the game's over or there's no more input.
+def cancel_pondering(ponder, time_manager):
+    time_manager.abort()
+    ponder['thread'].join()
+    time_manager.reset()
+
+# Named positions the benchmark searches, see run_benchmark().
+benchmark_positions = [
+    ('opening', start_position[:-1] + 'c'),
+    ('middlegame', "2RKR2/3B3/2N1N2/P1P1B1P/2p1P1p/p3p2/2nbn2/3b3/2rkr2 c"),
+    ('endgame', "7/2R4/2K4/P2b3/4p2/7/1Br4/3k3/4r2 c")
+]
 
-    # If board state has been seen before, return the evaluation.
-    # @TODO: If the board state has been seen before but hasn't been evaluated, return the best move.
-    previously_seen_state_info = transposition_table.get(board_object.get_state_hash())
-    if previously_seen_state_info:
-        seen_evaluation = previously_seen_state_info.get('evaluation')
-        if seen_evaluation:
-            return seen_evaluation
+# Compared to the baseline, a benchmark result this much worse is a regression.
+benchmark_tolerance = 0.1
 
-    if depth == max_depth:
-        # evaluation = evaluate(board_object, humans_turn)
-        evaluation = evaluate(board_object, humans_turn)
-        transposition_table[deepcopy(board_object.get_state_hash())] = {'evaluation': evaluation}
-        return evaluation
+# Times every benchmark search is run. The timings are their medians, so one slow run isn't a regression.
+benchmark_runs = 5
 
-    remaining_moves = get_all_remaining_moves(board_object.board, humans_turn, board_object.indexed_board, board_object.get_pieces_remaining().keys())
-    ordered_remaining_moves = order_moves(board_object, humans_turn, remaining_moves, depth)
-    if not humans_turn:
-        best_move_value = -9999
-        for piece, move_from, move_to in ordered_remaining_moves:
-            try:
-                check_if_time_is_up(time_elapsed)
-            except TimesUpException:
-                return best_move_value
-
-            exploded, captured = board_object.move(piece, move_from, move_to)
-            minimax_best_move_value = minimax(
-                board_object, 
-                depth+1, 
-                max_depth, 
-                not humans_turn,
-                alpha, 
-                beta,
-                time_elapsed + (datetime.datetime.now()-start_timestamp)
-            )
-            best_move_value = max(best_move_value, minimax_best_move_value)
+# Forgets everything earlier searches left behind, so a search doesn't depend on what ran before it.
+def clear_search_tables():
+    transposition_table.clear()
+    reset_move_ordering()
+    for history_scores in history_table:
+        history_scores[:] = [0] * len(history_scores)
+
+# Searches the position from scratch within the time manager's budget.
+# Returns dict like {'depth': ..., 'time_to_depth': ..., 'time': ..., 'nodes': ..., 'nps': ..., 'tt_hit_rate': ..., 'ebf': ..., 'move': ..., 'eval': ...}
+# where 'depth' is the deepest finished iteration, 'time_to_depth' is when it finished, and 'ebf' is
+# the effective branching factor: how many times more nodes that iteration took than the one before.
+def benchmark_search(position, time_manager):
+    board_object = Board(9,7)
+    humans_turn = board_object.load_position(position)
+    clear_search_tables()
+
+    # (<depth>, <nodes>, <time elapsed>) at the end of every finished iteration.
+    iterations = [(0, 0, 0.0)]
+    def report(depth, evaluation, principal_variation):
+        iterations.append((depth, time_manager.nodes, time_manager.get_elapsed()))
+
+    best_move, best_move_value = minimax_start(board_object, 5000, humans_turn, time_manager=time_manager, report=report)
+    time_elapsed = time_manager.get_elapsed()
+
+    depth, nodes, time_to_depth = iterations[-1]
+    previous_iteration_nodes = iterations[-2][1] - iterations[-3][1] if len(iterations) > 2 else 0
+    return {
+        'depth': depth,
+        'time_to_depth': round(time_to_depth, 4),
+        'time': round(time_elapsed, 4),
+        'nodes': time_manager.nodes,
+        'nps': int(time_manager.nodes / time_elapsed) if time_elapsed > 0 else 0,
+        'tt_hit_rate': round(transposition_table.hits / float(transposition_table.probes), 4) if transposition_table.probes else 0.0,
+        'ebf': round((nodes - iterations[-2][1]) / float(previous_iteration_nodes), 2) if previous_iteration_nodes else None,
+        'move': convert_move_to_notation(best_move) if best_move is not None else None,
+        'eval': best_move_value
+    }
+
+# Runs benchmark_search() a few times with a fresh time manager from get_time_manager().
+# Returns the results of the first run, with the medians of the timings of all the runs.
+# The search starts from scratch every time, so everything but the timings is the same every run.
+def benchmark_search_runs(position, get_time_manager, runs):
+    results = [benchmark_search(position, get_time_manager()) for _ in range(runs)]
+    median_result = dict(results[0])
+    for measurement in ('time_to_depth', 'time', 'nps'):
+        median_result[measurement] = sorted(result[measurement] for result in results)[len(results) // 2]
+    return median_result
+
+# Compares benchmark results to a baseline from an earlier run.
+# Returns list like ["<position> <search> <measurement>: <baseline> -> <result>"...] of the regressions.
+def compare_benchmarks(baseline, results, tolerance):
+    regressions = []
+    for name, searches in sorted(results['positions'].items()):
+        for search, result in sorted(searches.items()):
+            baseline_result = baseline.get('positions', {}).get(name, {}).get(search)
+            if baseline_result is None:
+                continue
+            # (<measurement>, <whether more is worse>)
+            for measurement, more_is_worse in (('time_to_depth', True), ('nodes', True), ('nps', False)):
+                # A node budget search always searches the same number of nodes.
+                if search == 'node_budget' and measurement != 'nps':
+                    continue
+                baseline_value, value = baseline_result.get(measurement), result.get(measurement)
+                if not baseline_value or value is None:
+                    continue
+                if (value > baseline_value * (1 + tolerance)) if more_is_worse else (value < baseline_value * (1 - tolerance)):
+                    regressions.append("{name} {search} {measurement}: {baseline_value} -> {value}".format(name=name, search=search, measurement=measurement, baseline_value=baseline_value, value=value))
+    return regressions
+
+# bench [depth 5] [nodes 20000] [runs 5] [compare <baseline file>] [tolerance 0.1]
+# Searches every benchmark position to a fixed depth, then with a fixed node budget, runs times each, and prints the results as JSON.
+# With compare, prints the regressions against the baseline file, a JSON file from an earlier bench,
+# to stderr, and exits with an error if there are any.
+def run_benchmark(arguments):
+    depth = 5
+    nodes = 20000
+    runs = benchmark_runs
+    baseline_file = None
+    tolerance = benchmark_tolerance
+    arguments = list(arguments)
+    while arguments:
+        argument = arguments.pop(0)
+        if argument == 'depth' and arguments:
+            depth = int(arguments.pop(0))
+        elif argument == 'nodes' and arguments:
+            nodes = int(arguments.pop(0))
+        elif argument == 'runs' and arguments:
+            runs = max(1, int(arguments.pop(0)))
+        elif argument == 'compare' and arguments:
+            baseline_file = arguments.pop(0)
+        elif argument == 'tolerance' and arguments:
+            tolerance = float(arguments.pop(0))
+        else:
+            sys.exit("Usage: python dalek bench [depth <depth>] [nodes <nodes>] [runs <runs>] [compare <baseline file>] [tolerance <fraction>]")
+
+    results = {'depth': depth, 'nodes': nodes, 'runs': runs, 'positions': {}}
+    for name, position in benchmark_positions:
+        results['positions'][name] = {
+            'fixed_depth': benchmark_search_runs(position, lambda: TimeManager(depth=depth), runs),
+            'node_budget': benchmark_search_runs(position, lambda: TimeManager(nodes=nodes), runs)
+        }
+    print(json.dumps(results, indent=2, sort_keys=True, separators=(',', ': ')))
+
+    if baseline_file is not None:
+        with open(baseline_file) as baseline:
+            regressions = compare_benchmarks(json.load(baseline), results, tolerance)
+        for regression in regressions:
+            sys.stderr.write("REGRESSION {regression}\n".format(regression=regression))
+        if regressions:
+            sys.exit(1)
+
+# Every worker process of run_batch() keeps the time manager every position gets a copy of.
+batch_worker = {}
+
+def initialize_batch_worker(time_manager):
+    batch_worker['time_manager'] = time_manager
+
+# Searches one position of a batch in a worker process, from scratch.
+# Returns the output line like "<position>\t<best move>\t<score>\t<depth>\t<nodes>",
+# where the best move is "none" if the game's over, or like "<position>\terror: <message>".
+def analyse_position(position):
+    board_object = Board(9,7)
+    try:
+        humans_turn = board_object.load_position(position)
+    except ValueError as error:
+        return "{position}\terror: {error}".format(position=position, error=error)
+
+    # is_game_over() wants the player who just moved.
+    game_over, winner = is_game_over(board_object, not humans_turn)
+    if game_over:
+        return "{position}\tnone\t\t0\t0".format(position=position)
+
+    time_manager = copy.copy(batch_worker['time_manager'])
+    # The deepest iteration that finished.
+    finished_depths = [0]
+    clear_search_tables()
+    best_move, best_move_value = minimax_start(board_object, 5000, humans_turn, time_manager=time_manager, report=lambda depth, evaluation, principal_variation: finished_depths.append(depth))
+    return "{position}\t{move}\t{score}\t{depth}\t{nodes}".format(position=position, move=convert_move_to_notation(best_move), score=best_move_value, depth=finished_depths[-1], nodes=time_manager.nodes)
+
+# Yields the positions of a batch, one per line. Blank lines and lines starting with # are left out.
+def read_positions(stream):
+    for line in stream:
+        position = line.strip()
+        if position and not position.startswith('#'):
+            yield position
+
+# Arguments of the batch command that go to parse_arguments(), all with a value.
+batch_options = ('workers', 'depth', 'nodes', 'movetime')
+
+# batch [file <file>] [workers <workers>] [depth <depth> | nodes <nodes> | movetime <seconds>]
+# Analyses the positions in the file, or stdin if there's no file or it's -, on a pool of worker processes,
+# one per CPU unless workers says otherwise. Prints a line per position, in the order they came in,
+# see analyse_position(). Only a few positions per worker are read ahead, so memory stays the same
+# however many positions there are.
+def run_batch(arguments):
+    input_file = '-'
+    search_arguments = []
+    arguments = list(arguments)
+    while arguments:
+        argument = arguments.pop(0)
+        if argument == 'file' and arguments:
+            input_file = arguments.pop(0)
+        elif argument in batch_options and arguments:
+            search_arguments += [argument, arguments.pop(0)]
+        else:
+            sys.exit("Usage: python dalek batch [file <file>|-] [workers <workers>] [depth <depth> | nodes <nodes> | movetime <seconds>]")
+    settings = parse_arguments(search_arguments)
+    time_manager = settings['time_manager']
+    workers = settings['workers'] if 'workers' in search_arguments else multiprocessing.cpu_count()
+
+    stream = open(input_file) if input_file != '-' else sys.stdin
+    pool = process_context.Pool(workers, initialize_batch_worker, (time_manager,))
+    pending_results = collections.deque()
+    try:
+        for position in read_positions(stream):
+            pending_results.append(pool.apply_async(analyse_position, (position,)))
+            if len(pending_results) >= workers * 2:
+                print(pending_results.popleft().get())
+                sys.stdout.flush()
+        while pending_results:
+            print(pending_results.popleft().get())
+            sys.stdout.flush()
+    finally:
+        pool.terminate()
+        pool.join()
+        if input_file != '-':
+            stream.close()
+
+# Searches the bot's best move in every board state up to plies moves into the game, and adds it to entries.
+# The bot's moves follow its best move, the human's moves branch into every move the human has.
+# @param entries: dict like {<state hash>: (<best move>, <evaluation>)}
+def add_book_entries(board_object, humans_turn, plies, time_manager, entries, verbose):
+    if plies == 0 or not board_object.bitboards['k'] or not board_object.bitboards['K']:
+        return
+    if humans_turn:
+        for move in get_all_remaining_moves(board_object, humans_turn):
+            board_object.make_move(move)
+            add_book_entries(board_object, not humans_turn, plies-1, time_manager, entries, verbose)
             board_object.retract_move()
-            alpha = max(alpha, best_move_value)
+        return
+
+    state_hash = board_object.get_state_hash(humans_turn)
+    # Board states reached by different move orders only get searched once.
+    if state_hash not in entries:
+        best_move, best_move_value = minimax_start(board_object, 5000, humans_turn, time_manager=time_manager)
+        if best_move is None:
+            return
+        entries[state_hash] = (best_move, best_move_value)
+        if verbose:
+            print("book || {position}: {move}, eval={eval}.".format(position=board_object.dump_position(humans_turn), move=convert_move_to_notation(best_move), eval=best_move_value))
+    board_object.make_move(entries[state_hash][0])
+    add_book_entries(board_object, not humans_turn, plies-1, time_manager, entries, verbose)
+    board_object.retract_move()
+
+# book [plies <plies>] [file <book file>] [verbose] [depth <depth> | nodes <nodes> | movetime <seconds>]
+# Builds the opening book: searches the bot's best move in the board states up to plies moves (4 by default)
+# into a game, whether the human or the bot goes first, and writes them to the book file.
+# Searching deep is slow, but it's done once, offline.
+def run_book(arguments):
+    plies = 4
+    book_path = opening_book.path
+    arguments = list(arguments)
+    for option in ('plies', 'file'):
+        if option in arguments[:-1]:
+            index = arguments.index(option)
+            value = arguments[index + 1]
+            del arguments[index:index + 2]
+            if option == 'plies':
+                plies = int(value)
+            else:
+                book_path = value
+    settings = parse_arguments(arguments)
+    verbose, time_manager = settings['verbose'], settings['time_manager']
+
+    entries = {}
+    start_time = clock()
+    for humans_turn in (False, True):
+        board_object = Board(9,7)
+        board_object.load_position(start_position[:-1] + ('h' if humans_turn else 'c'))
+        add_book_entries(board_object, humans_turn, plies, time_manager, entries, verbose)
+    write_book(book_path, entries)
+    print("Wrote {entries} board states to {path} in {time_elapsed:.1f}s.".format(entries=len(entries), path=book_path, time_elapsed=clock() - start_time))
+
+# Tablebase outcome of a move for the player making it, from the pieces on the board before it.
+# Moves that end the game are decided like is_game_over() does, the rest are looked up in tables,
+# which have to have every board state with fewer pieces, and the board states with these pieces the move can lead to.
+# @param piece_indices: list like [(<piece>, <index>)...]
+# @param tables: dict like {<signature>: <outcomes>}, see solve_tablebase().
+def get_move_outcome(piece_indices, move, humans_turn, tables):
+    piece, from_index, to_index = decode_move(move)
+    if move & EXPLOSION:
+        exploded_mask = explosion_masks[from_index]
+        piece_indices = [(other_piece, index) for other_piece, index in piece_indices if not exploded_mask & (1 << index)]
+    else:
+        piece_indices = [(other_piece, to_index if index == from_index else index) for other_piece, index in piece_indices if index != to_index]
 
-            move_hash = get_move_hash(piece,move_from,move_to)
-            
-            if depth not in killer_moves.keys() and depth > 1 and (exploded == False or captured == False):
-                killer_moves[depth] = []
+    kings_alive = [other_piece for other_piece, index in piece_indices if other_piece in ('k', 'K')]
+    # When explosion kills both kings, the player committing the explosion loses.
+    if not kings_alive:
+        return -2
+    if len(kings_alive) == 1:
+        return 1 if (kings_alive[0] == 'k') == humans_turn else -2
+
+    signature, index = get_signature_and_index(piece_indices, not humans_turn)
+    outcome = tables[signature][index]
+    return get_parent_outcome(outcome - 256 if outcome > 127 else outcome)
+
+# Solves every board state with the pieces of the signature by retrograde analysis.
+# Quiet moves always take a piece forward, and captures and explosions take pieces off the board, so no board
+# state can come back. The board states are solved from the ones with the pieces furthest forward back to the
+# ones furthest back, so every board state a move leads to is solved before the board states leading to it.
+# The game rules are the game's: the player moving after the other player can't move anything but an explosion
+# has lost (see is_game_over()), and a player with no moves at all can't win.
+# @param tables: dict like {<signature>: <outcomes>} with every signature with fewer pieces.
+# Returns bytearray of outcomes, see tablebase.get_signature_and_index().
+def solve_tablebase(signature, tables):
+    outcomes = bytearray(get_table_size(signature))
+    tables[signature] = outcomes
+    board_object = Board(9,7)
 
-            if beta <= alpha: # If alpha-beta cutoff.
-                if depth in killer_moves.keys():
-                    if move_hash not in killer_moves.get(depth, []):
-                        killer_moves[depth].insert(0, move_hash)
+    for indices in generate_placements(signature):
+        piece_indices = list(zip(signature, indices))
+        board_object.set_pieces(piece_indices)
+        remaining_moves = {
+            True: get_all_remaining_moves(board_object, True),
+            False: get_all_remaining_moves(board_object, False)
+        }
+        # The slot with the bot moving, the human's is the one after it.
+        index = get_signature_and_index(piece_indices, False)[1]
+        for humans_turn in (True, False):
+            if all(move & EXPLOSION for move in remaining_moves[not humans_turn]):
+                best_outcome = -1
+            elif not remaining_moves[humans_turn]:
+                best_outcome = 0
+            else:
+                best_outcome = None
+                for move in remaining_moves[humans_turn]:
+                    outcome = get_move_outcome(piece_indices, move, humans_turn, tables)
+                    if best_outcome is None or is_better_outcome(outcome, best_outcome):
+                        best_outcome = outcome
+            outcomes[index + (1 if humans_turn else 0)] = best_outcome % 256
+    return outcomes
+
+# tablebase [pieces <pieces>] [directory <directory>]
+# Solves every board state with both kings and up to pieces pieces in all (3 by default), fewest pieces first,
+# and writes a table per signature to the directory. Every piece more takes about 60 times longer.
+# tablebase check [positions <positions>] [seed <seed>] [directory <directory>]
+# Checks the search reports the scores of the tables in the directory, see check_tablebase_scores().
+def run_tablebase(arguments):
+    max_pieces = 3
+    directory = tablebases.directory
+    check = False
+    positions = 100
+    seed = 0
+    arguments = list(arguments)
+    if arguments[:1] == ['check']:
+        check = True
+        arguments.pop(0)
+    while arguments:
+        argument = arguments.pop(0)
+        if argument == 'pieces' and arguments and not check:
+            max_pieces = int(arguments.pop(0))
+        elif argument == 'positions' and arguments and check:
+            positions = int(arguments.pop(0))
+        elif argument == 'seed' and arguments and check:
+            seed = int(arguments.pop(0))
+        elif argument == 'directory' and arguments:
+            directory = arguments.pop(0)
+        else:
+            sys.exit("Usage: python dalek tablebase [pieces <pieces>] [directory <directory>]\n"
+                     "       python dalek tablebase check [positions <positions>] [seed <seed>] [directory <directory>]")
+
+    if check:
+        tables = Tablebases(directory)
+        if not tables.signatures:
+            sys.exit("No tablebases in {directory}.".format(directory=directory))
+        mismatches = check_tablebase_scores(tables, positions, seed)
+        for signature, position, tablebase_score, score in mismatches:
+            print("{position}: tablebase {tablebase_score}, search {score}".format(position=position, tablebase_score=tablebase_score, score=score))
+        if mismatches:
+            sys.exit("{mismatches} MISMATCHES.".format(mismatches=len(mismatches)))
+        print("All scores match.")
+        return
+
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    tables = {}
+    for pieces in range(2, max_pieces + 1):
+        for other_pieces in itertools.combinations_with_replacement("BNRPbnrp", pieces - 2):
+            signature, _ = get_signature_and_index([(piece, 0) for piece in ('K', 'k') + other_pieces], False)
+            start_time = clock()
+            outcomes = solve_tablebase(signature, tables)
+            write_tablebase(get_tablebase_path(directory, signature), outcomes)
+            # Only the tables with fewer pieces are needed to solve the rest.
+            if pieces == max_pieces:
+                del tables[signature]
+            print("{signature}: {time_elapsed:.1f}s".format(signature=signature, time_elapsed=clock() - start_time))
+            sys.stdout.flush()
+
+# Searches random board states the tablebases know a win or a loss for, and checks minimax_start() reports the
+# tablebase score, so a win still goes for the quickest way there and a loss for the slowest.
+# Board states where a move kills a king are left out: the search scores those by the material left, not by the game rules.
+# @param tables: Tablebases with the tables to check.
+# Returns list like [(<signature>, <position>, <tablebase score>, <reported score>)...] of the mismatches.
+def check_tablebase_scores(tables, positions, seed):
+    global tablebases
+    plain_tablebases = tablebases
+    tablebases = tables
+    rng = random.Random(seed)
+    board_object = Board(9,7)
+    mismatches = []
+    try:
+        for signature in sorted(tables.signatures, key=lambda signature: (len(signature), signature)):
+            checked_positions = 0
+            for _ in range(positions * 20):
+                if checked_positions == positions:
+                    break
+                piece_indices = list(zip(signature, rng.sample(range(63), len(signature))))
+                board_object.set_pieces(piece_indices)
+                humans_turn = rng.random() < 0.5
+                outcome = tables.probe(board_object, humans_turn)
+                # -1 and 1 are games over before or right after the move, decided by the game rules.
+                if outcome in (-1, 0, 1):
+                    continue
+                remaining_moves = get_all_remaining_moves(board_object, humans_turn)
+                kills_king = False
+                for move in remaining_moves:
+                    board_object.make_move(move)
+                    kills_king = not board_object.bitboards['k'] or not board_object.bitboards['K']
+                    board_object.retract_move()
+                    if kills_king:
+                        break
+                if kills_king:
+                    continue
+                transposition_table.clear()
+                _, score = minimax_start(board_object, 2, humans_turn, time_manager=TimeManager(depth=2))
+                checked_positions += 1
+                if score != get_tablebase_score(outcome, humans_turn):
+                    mismatches.append((signature, board_object.dump_position(humans_turn), get_tablebase_score(outcome, humans_turn), score))
+            print("{signature}: {positions} positions checked.".format(signature=signature, positions=checked_positions))
+            sys.stdout.flush()
+    finally:
+        tablebases = plain_tablebases
+        transposition_table.clear()
+    return mismatches
+
+# Engine options of a match that set the material of a piece.
+engine_material_options = ('p', 'n', 'b', 'r')
+
+# Engine options of a match that set a search parameter, and the global they set.
+engine_search_options = {
+    'aspiration': 'aspiration_window',
+    'delta': 'delta_margin'
+}
 
-                        if len(killer_moves) > 2:
-                            killer_moves[depth] = killer_moves[depth][:2]
+# Reads the options of an engine in a match, i.e. "nodes 2000 n 320 aspiration 30".
+# Takes the budget options of parse_arguments(), material of the pieces in engine_material_options,
+# and the search parameters in engine_search_options.
+# Returns dict like {'options': ..., 'time_manager': ..., 'material': ..., 'search_parameters': ...}.
+def parse_engine(options):
+    engine = {
+        'options': options,
+        'material': dict(material),
+        'search_parameters': dict((name, globals()[name]) for name in engine_search_options.values())
+    }
+    budget_arguments = []
+    arguments = options.split()
+    while arguments:
+        argument = arguments.pop(0)
+        if argument in engine_material_options and arguments:
+            engine['material'][argument] = int(arguments.pop(0))
+        elif argument in engine_search_options and arguments:
+            engine['search_parameters'][engine_search_options[argument]] = int(arguments.pop(0))
+        elif argument in ('movetime', 'time', 'increment', 'movestogo', 'depth', 'nodes') and arguments:
+            budget_arguments += [argument, arguments.pop(0)]
+        else:
+            sys.exit("Unknown engine option: {argument}".format(argument=argument))
+    engine['time_manager'] = parse_arguments(budget_arguments)['time_manager']
+    return engine
+
+# Makes the search play like the engine: its material, its search parameters, and its own transposition table
+# and history, so the engines of a match don't share what they found.
+def use_engine(engine):
+    global transposition_table, history_table
+    transposition_table = engine['transposition_table']
+    history_table = engine['history_table']
+    globals().update(engine['search_parameters'])
+    material.update(engine['material'])
+    square_scores.update(generate_square_scores())
+
+# A game of a match never takes more plies than this. Quiet moves only go forward, so games end long before.
+max_game_plies = 400
+
+# Every worker process of run_match() keeps the two engines, with their own search tables, set up by initialize_match_worker().
+match_worker = {}
+
+def initialize_match_worker(engines):
+    match_worker['engines'] = engines
+    for engine in engines:
+        engine['transposition_table'] = TranspositionTable()
+        engine['history_table'] = [[0 for _ in range(63)] for _ in range(63)]
+
+# Plays a game of a match in a worker process.
+# @param game: tuple like (<game number>, <opening moves>, <whether engine A is the computer>).
+# Returns tuple like (<game number>, <score of engine A>, <log line>), the log line like
+# "<game number> <A's side> <winner> <opening moves>/<moves>", the winner 'h', 'c' or 'd' for a draw.
+def play_game(game):
+    game_number, opening_moves, a_is_computer = game
+    engines = match_worker['engines']
+    for engine in engines:
+        engine['transposition_table'].clear()
+        for history_scores in engine['history_table']:
+            history_scores[:] = [0] * len(history_scores)
+    time_managers = [copy.copy(engine['time_manager']) for engine in engines]
 
-                return best_move_value
+    board_object = Board(9,7)
+    humans_turn = board_object.load_position(start_position)
+    for move in opening_moves:
+        board_object.make_move(move)
+        humans_turn = not humans_turn
+
+    moves_played = []
+    winner = 'd'
+    while len(opening_moves) + len(moves_played) < max_game_plies:
+        engine_index = 0 if humans_turn != a_is_computer else 1
+        use_engine(engines[engine_index])
+        # The evaluation the board keeps up to date is in the engine's material.
+        board_object.index_pieces()
+        best_move, best_move_value = minimax_start(board_object, 5000, humans_turn, time_manager=time_managers[engine_index])
+        time_managers[engine_index].stop()
+        # Neither player can win once the player moving can't move at all.
+        if best_move is None:
+            break
+        board_object.make_move(best_move)
+        moves_played.append(best_move)
+        game_over, game_winner = is_game_over(board_object, humans_turn)
+        if game_over:
+            winner = game_winner
+            break
+        humans_turn = not humans_turn
 
-        return best_move_value
+    if winner == 'd':
+        score = 0.5
     else:
-        best_move_value = 9999
-        for piece, move_from, move_to in ordered_remaining_moves:
-            try:
-                check_if_time_is_up(time_elapsed)
-            except TimesUpException:
-                return best_move_value
-            exploded, captured = board_object.move(piece, move_from, move_to)
-            minimax_best_move_value = minimax(
-                board_object, 
-                depth+1, 
-                max_depth, 
-                not humans_turn, 
-                alpha, 
-                beta,
-                time_elapsed + (datetime.datetime.now()-start_timestamp)
-            )
-            best_move_value = min(best_move_value, minimax_best_move_value)
-            board_object.retract_move()
-            beta = min(beta, best_move_value)
+        score = 1 if (winner == 'c') == a_is_computer else 0
+    log_line = "{game_number} {side} {winner} {opening_moves}/{moves}".format(
+        game_number=game_number,
+        side='c' if a_is_computer else 'h',
+        winner=winner,
+        opening_moves="".join(convert_move_to_notation(move) for move in opening_moves),
+        moves="".join(convert_move_to_notation(move) for move in moves_played)
+    )
+    return (game_number, score, log_line)
 
-            move_hash = get_move_hash(piece,move_from,move_to)
-            
-            if depth not in killer_moves.keys() and depth > 1 and (exploded == False or captured == False):
-                killer_moves[depth] = []
+# Random opening for a match: plies random moves from the starting position, explosions left out.
+# Returns the moves, or None if the game ended on the way.
+def make_opening(rng, plies):
+    board_object = Board(9,7)
+    humans_turn = board_object.load_position(start_position)
+    opening_moves = []
+    for _ in range(plies):
+        remaining_moves = [move for move in get_all_remaining_moves(board_object, humans_turn) if not move & EXPLOSION]
+        if not remaining_moves:
+            return None
+        move = rng.choice(remaining_moves)
+        board_object.make_move(move)
+        opening_moves.append(move)
+        if is_game_over(board_object, humans_turn)[0]:
+            return None
+        humans_turn = not humans_turn
+    return opening_moves
+
+# Yields the games of a match: every opening gets played twice, with the engines switching sides.
+def generate_games(games, opening_plies, seed):
+    rng = random.Random(seed)
+    game_number = 0
+    while game_number < games:
+        opening_moves = make_opening(rng, opening_plies)
+        if opening_moves is None:
+            continue
+        for a_is_computer in (True, False):
+            if game_number < games:
+                yield (game_number, opening_moves, a_is_computer)
+                game_number += 1
+
+# Prints the results so far of a match, A against B.
+def print_match_results(match_results):
+    elo, margin = match_results.get_elo()
+    print("Games: {games}, A won {wins}, drew {draws}, lost {losses}. Elo: {elo:+.1f} +/- {margin:.1f}. LLR: {llr:.2f} ({lower_bound:.2f}, {upper_bound:.2f}).".format(
+        games=match_results.get_games(),
+        wins=match_results.wins,
+        draws=match_results.draws,
+        losses=match_results.losses,
+        elo=elo,
+        margin=margin,
+        llr=match_results.get_log_likelihood_ratio(),
+        lower_bound=match_results.lower_bound,
+        upper_bound=match_results.upper_bound
+    ))
+    sys.stdout.flush()
+
+# match [games <games>] [workers <workers>] [openings <plies>] [seed <seed>] [log <file>] [elo0 <elo>] [elo1 <elo>] engine "<options>" engine "<options>"
+# Plays engine A, the first one, against engine B, on a pool of worker processes, one per CPU unless workers
+# says otherwise. See parse_engine() for the options. Every game starts from a random opening of plies moves
+# (4 by default), played once with each engine on each side. Prints the results every 100 games, stops early
+# once the SPRT of MatchResults decides between elo0 and elo1, and writes a line per game to the log file.
+def run_match(arguments):
+    games = 1000
+    workers = multiprocessing.cpu_count()
+    opening_plies = 4
+    seed = 1
+    log_file = None
+    elo0, elo1 = 0.0, 5.0
+    engines = []
+    arguments = list(arguments)
+    while arguments:
+        argument = arguments.pop(0)
+        if argument == 'games' and arguments:
+            games = int(arguments.pop(0))
+        elif argument == 'workers' and arguments:
+            workers = int(arguments.pop(0))
+        elif argument == 'openings' and arguments:
+            opening_plies = int(arguments.pop(0))
+        elif argument == 'seed' and arguments:
+            seed = int(arguments.pop(0))
+        elif argument == 'log' and arguments:
+            log_file = arguments.pop(0)
+        elif argument == 'elo0' and arguments:
+            elo0 = float(arguments.pop(0))
+        elif argument == 'elo1' and arguments:
+            elo1 = float(arguments.pop(0))
+        elif argument == 'engine' and arguments:
+            engines.append(parse_engine(arguments.pop(0)))
+        else:
+            engines = []
+            break
+    if len(engines) != 2:
+        sys.exit('Usage: python dalek match [games <games>] [workers <workers>] [openings <plies>] [seed <seed>] [log <file>] [elo0 <elo>] [elo1 <elo>] engine "<options>" engine "<options>"')
+
+    print("A: {a_options}".format(a_options=engines[0]['options']))
+    print("B: {b_options}".format(b_options=engines[1]['options']))
+    match_results = MatchResults(elo0, elo1)
+    log = open(log_file, 'w') if log_file is not None else None
+    pool = process_context.Pool(workers, initialize_match_worker, (engines,))
+    try:
+        for game_number, score, log_line in pool.imap_unordered(play_game, generate_games(games, opening_plies, seed)):
+            match_results.add(score)
+            if log is not None:
+                log.write(log_line + "\n")
+            if match_results.get_games() % 100 == 0:
+                print_match_results(match_results)
+            if match_results.get_verdict() is not None:
+                break
+    finally:
+        pool.terminate()
+        pool.join()
+        if log is not None:
+            log.close()
+
+    print_match_results(match_results)
+    verdict = match_results.get_verdict()
+    if verdict == 'H1':
+        print("SPRT: A is stronger by at least {elo1} Elo.".format(elo1=elo1))
+    elif verdict == 'H0':
+        print("SPRT: A isn't stronger by {elo1} Elo.".format(elo1=elo1))
+    else:
+        print("SPRT: no verdict yet.")
 
-            if beta <= alpha: # If alpha-beta cutoff.
-                if depth in killer_moves.keys():
-                    if move_hash not in killer_moves[depth]:
-                        killer_moves[depth].insert(0, move_hash)
+# Keeps the lines the engine protocol writes from the search thread and the main thread whole.
+protocol_output_lock = threading.Lock()
 
-                        if len(killer_moves) > 2:
-                            killer_moves[depth] = killer_moves[depth][:2]
+# Writes a line of the engine protocol.
+def send(line):
+    with protocol_output_lock:
+        sys.stdout.write(line + "\n")
+        sys.stdout.flush()
 
-                return best_move_value
+# Reads a position command's arguments, i.e. startpos moves c4c5 or notation <board> <side> moves c4c5 b9c7.
+# Returns tuple like (board_object, humans_turn). Raises ValueError if the position or a move is bad.
+def parse_position(arguments):
+    board_object = Board(9,7)
+    if arguments[:1] == ['startpos']:
+        humans_turn = board_object.load_position(start_position)
+        arguments = arguments[1:]
+    elif arguments[:1] == ['notation'] and len(arguments) >= 3:
+        humans_turn = board_object.load_position(" ".join(arguments[1:3]))
+        arguments = arguments[3:]
+    else:
+        raise ValueError("Expected startpos or notation <board> <side>.")
+
+    if arguments[:1] == ['moves']:
+        for notation in arguments[1:]:
+            if len(notation) != 4:
+                raise ValueError("Bad move: {move}".format(move=notation))
+            start, end = convert_move_notation_to_board(notation[:2]), convert_move_notation_to_board(notation[2:])
+            if not (0 <= start[0] < 9 and 0 <= start[1] < 7 and 0 <= end[0] < 9 and 0 <= end[1] < 7):
+                raise ValueError("Bad move: {move}".format(move=notation))
+            move = create_move(board_object, start, end)
+            if board_object.board[start[0]][start[1]] == '-' or not is_move_on_board(board_object, move, humans_turn):
+                raise ValueError("Illegal move: {move}".format(move=notation))
+            board_object.make_move(move)
+            humans_turn = not humans_turn
+    elif arguments:
+        raise ValueError("Expected moves.")
+    return (board_object, humans_turn)
+
+# Reads a go command's arguments, i.e. depth 6 or nodes 100000 or movetime 2000 or
+# htime 300000 ctime 300000 hinc 2000 cinc 2000 movestogo 30 or infinite. Times are in milliseconds.
+# With ponder, the search runs without a deadline until ponderhit or stop.
+# Returns a TimeManager for the side to move.
+def parse_go(arguments, humans_turn):
+    budget = {}
+    arguments = list(arguments)
+    while arguments:
+        argument = arguments.pop(0)
+        if argument in ('infinite', 'ponder'):
+            budget[argument] = True
+            continue
+        if not arguments:
+            raise ValueError("Expected a value after {argument}.".format(argument=argument))
+        value = arguments.pop(0)
+        if argument == 'depth':
+            budget['depth'] = int(value)
+        elif argument == 'nodes':
+            budget['nodes'] = int(value)
+        elif argument == 'movetime':
+            budget['movetime'] = int(value) / 1000.0
+        elif argument == 'movestogo':
+            budget['moves_to_go'] = int(value)
+        elif argument in ('htime', 'ctime'):
+            if (argument == 'htime') == humans_turn:
+                budget['time_left'] = int(value) / 1000.0
+        elif argument in ('hinc', 'cinc'):
+            if (argument == 'hinc') == humans_turn:
+                budget['increment'] = int(value) / 1000.0
+        else:
+            raise ValueError("Unknown go argument: {argument}".format(argument=argument))
+    ponder = budget.pop('ponder', False)
+    time_manager = TimeManager(**budget)
+    if ponder:
+        time_manager.ponder()
+    return time_manager
+
+# Runs on the search thread of the engine protocol.
+# Sends an info line after every finished iteration and the best move at the end,
+# with the reply it expects to ponder on, if it has one.
+# Scores are from the point of view of the player moving, like the protocol expects.
+def search_for_protocol(board_object, humans_turn, time_manager):
+    def send_info(depth, evaluation, principal_variation):
+        time_elapsed = time_manager.get_elapsed()
+        send("info depth {depth} score cp {score} nodes {nodes} nps {nps} time {time} pv {principal_variation}".format(
+            depth=depth,
+            score=-evaluation if humans_turn else evaluation,
+            nodes=time_manager.nodes,
+            nps=int(time_manager.nodes / time_elapsed) if time_elapsed > 0 else 0,
+            time=int(time_elapsed * 1000),
+            principal_variation=" ".join(convert_move_to_notation(move) for move in principal_variation)
+        ))
+    # The first two moves of the last principal variation.
+    expected_moves = []
+    def report(depth, evaluation, principal_variation):
+        send_info(depth, evaluation, principal_variation)
+        expected_moves[:] = principal_variation[:2]
+    best_move, best_move_value = minimax_start(board_object, 5000, humans_turn, time_manager=time_manager, report=report, book=opening_book)
+    if best_move is None:
+        send("bestmove none")
+    elif len(expected_moves) == 2 and expected_moves[0] == best_move:
+        send("bestmove {move} ponder {reply}".format(move=convert_move_to_notation(best_move), reply=convert_move_to_notation(expected_moves[1])))
+    else:
+        send("bestmove {move}".format(move=convert_move_to_notation(best_move)))
+
+# Line based engine protocol on stdin and stdout, like UCI:
+# uci, isready, ucinewgame, position startpos|notation <board> <side> [moves ...],
+# go [depth|nodes|movetime|htime|ctime|hinc|cinc|movestogo <value>] [infinite] [ponder], ponderhit, stop and quit.
+# With cache [<file>] in the arguments, the search uses the transposition cache.
+# The search runs on its own thread, so stop gets its bestmove right away.
+def run_protocol(arguments):
+    global transposition_cache
+    if arguments[:1] == ['cache'] and len(arguments) <= 2:
+        transposition_cache = TranspositionCache(arguments[1] if len(arguments) == 2 else default_cache_path)
+    elif arguments:
+        sys.exit("Usage: python dalek uci [cache [<file>]]")
+    board_object = Board(9,7)
+    humans_turn = board_object.load_position(start_position)
+    # (<thread>, <time manager>) of the search running now, or None.
+    search = None
+
+    # Stops the search running now, if any. It sends its bestmove before this returns.
+    def stop_search(search):
+        if search is not None:
+            search_thread, time_manager = search
+            time_manager.abort()
+            search_thread.join()
+
+    # Reading line by line, since iterating stdin reads ahead on Python 2.
+    for line in iter(sys.stdin.readline, ''):
+        arguments = line.split()
+        if not arguments:
+            continue
+        command, arguments = arguments[0], arguments[1:]
+        try:
+            if command == 'uci':
+                send("id name dalek")
+                send("uciok")
+            elif command == 'isready':
+                send("readyok")
+            elif command == 'ucinewgame':
+                stop_search(search)
+                search = None
+                clear_search_tables()
+            elif command == 'position':
+                stop_search(search)
+                search = None
+                board_object, humans_turn = parse_position(arguments)
+            elif command == 'go':
+                stop_search(search)
+                time_manager = parse_go(arguments, humans_turn)
+                search_thread = threading.Thread(target=search_for_protocol, args=(board_object, humans_turn, time_manager))
+                search_thread.daemon = True
+                search_thread.start()
+                search = (search_thread, time_manager)
+            elif command == 'ponderhit':
+                if search is not None:
+                    search[1].ponder_hit()
+            elif command == 'stop':
+                stop_search(search)
+                search = None
+            elif command == 'quit':
+                break
+            else:
+                send("info string Unknown command: {command}".format(command=command))
+        except ValueError as error:
+            send("info string {error}".format(error=error))
+    stop_search(search)
+
+# Perft node counts from the starting position, when the human or the computer moves first.
+# perft_reference_counts[<position>][<depth>] = <nodes>
+# Any change to the move generator or the board has to keep reproducing these.
+perft_reference_counts = {
+    start_position: {1: 30, 2: 804, 3: 20431, 4: 519343},
+    start_position[:-1] + 'c': {1: 30, 2: 804, 3: 20431, 4: 519343}
+}
 
-        return best_move_value
+# Counts the board states exactly depth moves away, to check and time the move generator.
+# Nothing moves once a king is dead, the game's over.
+def perft(board_object, depth, humans_turn):
+    if depth == 0:
+        return 1
+    if not board_object.bitboards['k'] or not board_object.bitboards['K']:
+        return 0
+    remaining_moves = get_all_remaining_moves(board_object, humans_turn)
+    # The board states right after these moves don't need to be made to be counted.
+    if depth == 1:
+        return len(remaining_moves)
+    nodes = 0
+    for move in remaining_moves:
+        board_object.make_move(move)
+        nodes += perft(board_object, depth-1, not humans_turn)
+        board_object.retract_move()
+    return nodes
+
+# perft <depth> [position]
+# Prints the perft count under every move from the position (the starting position, human to move, if None),
+# then the total, the nodes per second and whether the total matches perft_reference_counts.
+def run_perft(arguments):
+    if not arguments or not arguments[0].isdigit():
+        sys.exit("Usage: python dalek perft <depth> [position]")
+    depth = int(arguments[0])
+    position = " ".join(arguments[1:]) or start_position
+    board_object = Board(9,7)
+    try:
+        humans_turn = board_object.load_position(position)
+    except ValueError as error:
+        sys.exit(str(error))
+
+    start_time = clock()
+    total_nodes = 0
+    if depth == 0:
+        total_nodes = 1
+    else:
+        for move in get_all_remaining_moves(board_object, humans_turn):
+            board_object.make_move(move)
+            nodes = perft(board_object, depth-1, not humans_turn)
+            board_object.retract_move()
+            total_nodes += nodes
+            print("{move}: {nodes}".format(move=convert_move_to_notation(move), nodes=nodes))
+    time_elapsed = clock() - start_time
+
+    print("Nodes: {nodes}".format(nodes=total_nodes))
+    print("Time: {time_elapsed:.3f}s".format(time_elapsed=time_elapsed))
+    print("Nodes per second: {nodes_per_second:.0f}".format(nodes_per_second=total_nodes / time_elapsed if time_elapsed > 0 else 0))
+    reference_nodes = perft_reference_counts.get(board_object.dump_position(humans_turn), {}).get(depth)
+    if reference_nodes is not None:
+        if reference_nodes != total_nodes:
+            sys.exit("Reference: {reference_nodes}, MISMATCH.".format(reference_nodes=reference_nodes))
+        print("Reference: {reference_nodes}, ok.".format(reference_nodes=reference_nodes))
 
 # Main method. Script starts here.
 if __name__ == '__main__':
+    # Generate all moves and put those moves in the global moves dictionary variable.
+    generate_all_moves()
+    generate_all_masks()
+
+    if sys.argv[1:2] == ['perft']:
+        run_perft(sys.argv[2:])
+        sys.exit()
+    if sys.argv[1:2] == ['bench']:
+        run_benchmark(sys.argv[2:])
+        sys.exit()
+    if sys.argv[1:2] == ['batch']:
+        run_batch(sys.argv[2:])
+        sys.exit()
+    if sys.argv[1:2] == ['book']:
+        run_book(sys.argv[2:])
+        sys.exit()
+    if sys.argv[1:2] == ['match']:
+        run_match(sys.argv[2:])
+        sys.exit()
+    if sys.argv[1:2] == ['tablebase']:
+        run_tablebase(sys.argv[2:])
+        sys.exit()
+    if sys.argv[1:2] == ['uci']:
+        run_protocol(sys.argv[2:])
+        sys.exit()
+
     # Check if the human moves first.
     human_goes_first = None
-    verbose = False
-    if len(sys.argv) >= 2:
-        verbose = sys.argv[1] == 'verbose'
+    settings = parse_arguments(sys.argv[1:])
+    verbose = settings['verbose']
+    time_manager = settings['time_manager']
+    workers = settings['workers']
+    helpers = settings['helpers']
+    stats = settings['stats']
+    pondering = settings['ponder']
+    if settings['cache'] is not None:
+        transposition_cache = TranspositionCache(settings['cache'])
 
     while human_goes_first not in ["y","n"]:
         human_goes_first = raw_input("Human goes first (Y/N)? ").lower()
@@ -741,34 +2282,64 @@ if __name__ == '__main__':
     # Create the board object.
     board_object = Board(9,7)
 
-    # Generate all moves and put those moves in the global moves dictionary variable.
-    generate_all_moves()
-
     game_over = False
     winner = None
 
-    # Game loop!
-    while not game_over:
-        board_object.display()
-
-        if humans_turn:
-            human_move_input = raw_input("Human's move i.e. A2D2: ").lower()
-            human_move_start_pos = convert_move_notation_to_board(human_move_input[:2])
-            human_move_end_pos = convert_move_notation_to_board(human_move_input[2:])
-            piece = board_object.board[human_move_start_pos[0]][human_move_start_pos[1]]
-            if not is_legal_move(piece, moves, human_move_start_pos, human_move_end_pos, board_object.indexed_board, board_object.board, humans_turn):
-                print("Illegal move.")
-                continue
-            board_object.move(piece, human_move_start_pos, human_move_end_pos)
-        else:
-            print("Computer's move.")
-            best_bot_move, best_move_value = minimax_start(board_object, 5000, humans_turn, verbose=verbose)
-            from_position_converted, to_position_converted = convert_board_notation_to_move(best_bot_move[1]), convert_board_notation_to_move(best_bot_move[2])
-            print("Bot moving: {piece}, {start}{end} ({start_inverted}{end_inverted})".format(piece=best_bot_move[0], start=from_position_converted, end=to_position_converted, start_inverted=inverted_position_mapping[from_position_converted], end_inverted=inverted_position_mapping[to_position_converted]))
-            board_object.move(best_bot_move[0], best_bot_move[1], best_bot_move[2])
+    # The human's move the bot's last search expected, and the search pondering on it during the human's turn.
+    expected_human_move = None
+    ponder = None
+    pondered_result = None
 
-        game_over,winner = is_game_over(board_object.board, humans_turn, board_object.indexed_board, board_object.get_pieces_remaining().keys())
-        humans_turn = not humans_turn
+    # Game loop!
+    try:
+        while not game_over:
+            board_object.display()
+
+            if humans_turn:
+                if pondering and ponder is None:
+                    ponder = start_pondering(board_object, expected_human_move, time_manager)
+                human_move_input = raw_input("Human's move i.e. A2D2: ").lower()
+                human_move_start_pos = convert_move_notation_to_board(human_move_input[:2])
+                human_move_end_pos = convert_move_notation_to_board(human_move_input[2:])
+                piece = board_object.board[human_move_start_pos[0]][human_move_start_pos[1]]
+                if not is_legal_move(piece, moves, human_move_start_pos, human_move_end_pos, board_object.indexed_board, board_object.board, humans_turn):
+                    print("Illegal move.")
+                    continue
+                human_move = create_move(board_object, human_move_start_pos, human_move_end_pos)
+                if ponder is not None:
+                    pondered_result = stop_pondering(ponder, human_move, time_manager)
+                    ponder = None
+                board_object.make_move(human_move)
+            else:
+                print("Computer's move.")
+                if pondered_result is not None:
+                    print("Ponder hit.")
+                    best_bot_move, best_move_value, principal_variation = pondered_result
+                    pondered_result = None
+                else:
+                    principal_variation = []
+                    def report(depth, evaluation, iteration_principal_variation):
+                        principal_variation[:] = iteration_principal_variation
+                    statistics = SearchStatistics() if verbose or stats else None
+                    best_bot_move, best_move_value = minimax_start(board_object, 5000, humans_turn, verbose=verbose, time_manager=time_manager, workers=workers, helpers=helpers, report=report, statistics=statistics, book=opening_book)
+                    if verbose:
+                        for name, value in sorted(statistics.get_report().items()):
+                            print("search statistics || {name}: {value}".format(name=name, value=value))
+                    if stats:
+                        print(json.dumps(statistics.get_report(), sort_keys=True))
+                time_manager.stop()
+                expected_human_move = principal_variation[1] if len(principal_variation) > 1 and principal_variation[0] == best_bot_move else None
+                bot_move_converted = convert_move_to_notation(best_bot_move)
+                from_position_converted, to_position_converted = bot_move_converted[:2], bot_move_converted[2:]
+                print("Bot moving: {piece}, {start}{end} ({start_inverted}{end_inverted})".format(piece=get_move_piece(best_bot_move), start=from_position_converted, end=to_position_converted, start_inverted=inverted_position_mapping[from_position_converted], end_inverted=inverted_position_mapping[to_position_converted]))
+                board_object.make_move(best_bot_move)
+
+            game_over,winner = is_game_over(board_object, humans_turn)
+            humans_turn = not humans_turn
+    finally:
+        # Don't leave the pondering search running when the game's over, or on the way out.
+        if ponder is not None:
+            cancel_pondering(ponder, time_manager)
     board_object.display()
     print("Game Over.")
     print("Winner: {winner}".format(winner=winner))
@@ -1,5 +1,7 @@
 from __future__ import print_function
-from copy import deepcopy
+import random
+from evaluation import square_scores
+from move_encoding import encode_move, move_pieces
 """ Initial board state.
  
      - N R K R N -  (COMPUTER)
@@ -14,6 +16,39 @@ from copy import deepcopy
 
 """
 
+# Position notation: the rows from the computer's side (top) down to the human's side, separated by '/',
+# with a digit for every run of empty squares, then a space and whose move it is, 'h' or 'c'.
+start_position = "1NRKRN1/3B3/3B3/P1P1P1P/7/p1p1p1p/3b3/3b3/1nrkrn1 h"
+
+# Bit (row*7 + col) of a bitboard stands for the square at (row, col).
+board_mask = (1 << 63) - 1
+
+def popcount(bitboard):
+	return bin(bitboard).count("1")
+
+# Builds the 3x3 explosion masks.
+# explosion_masks[<index>] has a bit set for every square an explosion on <index> clears, including <index> itself.
+def generate_explosion_masks(rows, columns):
+	masks = []
+	for index in range(rows*columns):
+		row, col = divmod(index, columns)
+		mask = 0
+		for explosion_row in range(row-1, row+2):
+			for explosion_col in range(col-1, col+2):
+				if 0 <= explosion_row < rows and 0 <= explosion_col < columns:
+					mask |= 1 << (explosion_row*columns + explosion_col)
+		masks.append(mask)
+	return masks
+
+explosion_masks = generate_explosion_masks(9, 7)
+
+# Zobrist keys. zobrist_keys[<piece>][<index>] is XORed into the state hash while <piece> sits on <index>.
+# Seeded so every process hashes the same board state to the same key.
+# getrandbits() returns longs on Python 2, int() turns them into plain ints, which 63 bits fit in on 64-bit Python 2.
+zobrist_random = random.Random(5381)
+zobrist_keys = dict((piece, [int(zobrist_random.getrandbits(63)) for _ in range(63)]) for piece in "bnrpkBNRPK")
+zobrist_humans_turn = int(zobrist_random.getrandbits(63))
+
 class Board:
 	def __init__(self, rows, columns):
 		self.rows = rows
@@ -31,113 +66,266 @@ class Board:
 		]
 
 		self.indexed_board = [[j for j in range(i,i+7)] for i in range(0, 63, 7)]
+		self.index_pieces()
+
+	# Builds everything derived from the pieces on the board, and forgets the moves made so far.
+	def index_pieces(self):
+		# One bitboard per piece, plus the occupancy of each side.
+		# 'h' is every human (lowercase) piece, 'c' is every computer (uppercase) piece.
+		self.bitboards = dict((piece, 0) for piece in "bnrpkBNRPK")
+		self.occupied = {'h': 0, 'c': 0}
+		# Zobrist hash of the pieces on the board, kept up to date by move() and retract_move().
+		self.zobrist_hash = 0
+		for row_index in range(self.rows):
+			for col_index in range(self.columns):
+				piece = self.board[row_index][col_index]
+				if piece != "-":
+					index = self.indexed_board[row_index][col_index]
+					self.bitboards[piece] |= 1 << index
+					self.occupied['c' if piece.isupper() else 'h'] |= 1 << index
+					self.zobrist_hash ^= zobrist_keys[piece][index]
+
+		# Evaluation of the board from the bot's point of view, kept up to date by move() and retract_move().
+		self.evaluation = self.compute_evaluation()
+
+		# Undo records, one per move. Each record in this list looks like:
+		# (<piece>, <start_index>, <end_index>, <captured_piece>, <exploded_mask>, <exploded_pieces>, <zobrist_hash>, <evaluation>)
+		# <exploded_pieces> are the pieces an explosion cleared, in the same order as the bits of <exploded_mask>.
+		self.move_stack = []
 
-		# List of lists. Each list in this list looks like:
-		# <board_state>
+	# Sets up the board with only these pieces, i.e. [('K', 3), ('k', 59)], like load_position()
+	# but without going through every square, for code that sets up a lot of boards.
+	def set_pieces(self, piece_indices):
+		self.board = [["-"] * self.columns for _ in range(self.rows)]
+		self.bitboards = dict((piece, 0) for piece in "bnrpkBNRPK")
+		self.occupied = {'h': 0, 'c': 0}
+		self.zobrist_hash = 0
+		for piece, index in piece_indices:
+			row, col = divmod(index, self.columns)
+			self.board[row][col] = piece
+			self.bitboards[piece] |= 1 << index
+			self.occupied['c' if piece.isupper() else 'h'] |= 1 << index
+			self.zobrist_hash ^= zobrist_keys[piece][index]
+		self.evaluation = self.compute_evaluation()
 		self.move_stack = []
+
+	# Sets up the board from position notation, see start_position.
+	# Returns whether or not it's the human's turn.
+	def load_position(self, position):
+		fields = position.split()
+		rows = fields[0].split('/') if fields else []
+		if len(fields) != 2 or fields[1] not in ('h', 'c') or len(rows) != self.rows:
+			raise ValueError("Bad position: {position}".format(position=position))
+		board = []
+		for row in rows:
+			squares = []
+			for square in row:
+				if square.isdigit():
+					squares.extend('-' * int(square))
+				elif square in move_pieces:
+					squares.append(square)
+				else:
+					raise ValueError("Bad position: {position}".format(position=position))
+			if len(squares) != self.columns:
+				raise ValueError("Bad position: {position}".format(position=position))
+			board.append(squares)
+		self.board = board
+		self.index_pieces()
+		return fields[1] == 'h'
+
+	# Returns the board in position notation, see start_position.
+	def dump_position(self, humans_turn):
+		rows = []
+		for row in self.board:
+			notation = ""
+			empty_squares = 0
+			for square in row:
+				if square == '-':
+					empty_squares += 1
+					continue
+				if empty_squares:
+					notation += str(empty_squares)
+					empty_squares = 0
+				notation += square
+			if empty_squares:
+				notation += str(empty_squares)
+			rows.append(notation)
+		return "/".join(rows) + (" h" if humans_turn else " c")
 	
+	# Undoes the last move by putting back only the squares it changed.
 	def retract_move(self):
-		self.board = self.move_stack.pop()
+		piece, start_index, end_index, captured_piece, exploded_mask, exploded_pieces, self.zobrist_hash, self.evaluation = self.move_stack.pop()
+
+		if start_index == end_index:
+			exploded_index = 0
+			while exploded_mask:
+				bit = exploded_mask & -exploded_mask
+				exploded_mask ^= bit
+				row, col = divmod(bit.bit_length() - 1, self.columns)
+				exploded_piece = exploded_pieces[exploded_index]
+				self.board[row][col] = exploded_piece
+				self.bitboards[exploded_piece] |= bit
+				self.occupied['c' if exploded_piece.isupper() else 'h'] |= bit
+				exploded_index += 1
+		else:
+			start_row, start_col = divmod(start_index, self.columns)
+			end_row, end_col = divmod(end_index, self.columns)
+			move_bits = (1 << start_index) | (1 << end_index)
+			self.bitboards[piece] ^= move_bits
+			self.occupied['c' if piece.isupper() else 'h'] ^= move_bits
+			self.board[start_row][start_col] = piece
+
+			if captured_piece is not None:
+				self.bitboards[captured_piece] |= 1 << end_index
+				self.occupied['c' if captured_piece.isupper() else 'h'] |= 1 << end_index
+				self.board[end_row][end_col] = captured_piece
+			else:
+				self.board[end_row][end_col] = "-"
 
-	def get_state_hash(self):
-		return "".join(["".join(row) for row in self.board])
+	# Evaluates the board from scratch: material, piece square tables and explosion adjacency.
+	def compute_evaluation(self):
+		evaluation = 0
+		for piece, pieces_left in self.bitboards.items():
+			while pieces_left:
+				bit = pieces_left & -pieces_left
+				pieces_left ^= bit
+				index = bit.bit_length() - 1
+				evaluation += square_scores[piece][index]
+				# Maximize Explosions...
+				# Count how many of the opposing pieces each piece would take with it. Kings can't explode.
+				if piece == 'K' or piece == 'k':
+					continue
+				if piece.isupper():
+					evaluation += popcount(explosion_masks[index] & self.occupied['h'])
+				else:
+					evaluation -= popcount(explosion_masks[index] & self.occupied['c'])
+		return evaluation
+
+	# How much the piece on this index adds to the explosion adjacency part of the evaluation:
+	# the opposing pieces it would take with it, and the opposing pieces that would take it with them.
+	def get_adjacency_score(self, piece, index):
+		explosion_mask = explosion_masks[index]
+		if piece.isupper():
+			human_occupied = self.occupied['h']
+			score = -popcount(explosion_mask & human_occupied & ~self.bitboards['k'])
+			if piece != 'K':
+				score += popcount(explosion_mask & human_occupied)
+		else:
+			computer_occupied = self.occupied['c']
+			score = popcount(explosion_mask & computer_occupied & ~self.bitboards['K'])
+			if piece != 'k':
+				score -= popcount(explosion_mask & computer_occupied)
+		return score
 
+	# Same board state with a different player to move gets a different hash.
+	def get_state_hash(self, humans_turn=False):
+		return self.zobrist_hash ^ zobrist_humans_turn if humans_turn else self.zobrist_hash
+
+	# The bitboards double as the piece location index: they only have bits for pieces still on the board.
 	def get_location_of_piece(self, piece):
-		for row_index in range(len(self.board)):
-			for col_index in range(len(self.board[row_index])):
-				if self.board[row_index][col_index] == piece:
-					return (row_index,col_index)
+		pieces_left = self.bitboards[piece]
+		if pieces_left:
+			return divmod((pieces_left & -pieces_left).bit_length() - 1, self.columns)
+
+	# @param piece_type OPTIONAL: 'c' for computer, 'h' for human.
+	# Returns a list of (piece, index) for every piece on the board.
+	def get_piece_indices(self, piece_type=None):
+		piece_indices = []
+		for piece, pieces_left in self.bitboards.items():
+			if piece_type == 'c' and piece.islower() or piece_type == 'h' and piece.isupper():
+				continue
+			while pieces_left:
+				bit = pieces_left & -pieces_left
+				pieces_left ^= bit
+				piece_indices.append((piece, bit.bit_length() - 1))
+		return piece_indices
 
+	# Returns a dict of piece to the list of (row, col) of every one of those pieces left on the board.
 	def get_pieces_remaining(self):
 		pieces = {}
-		row_index = 0
-		for row in self.board:
-			col_index = 0
-			for col in row:
-				if col != "-":
-					pieces[col] = (row_index, col_index)
-				col_index += 1
-			row_index += 1
-					
+		for piece, index in self.get_piece_indices():
+			pieces.setdefault(piece, []).append(divmod(index, self.columns))
 		return pieces
 
 	# @param start: position of the piece.
 	# @param piece_type OPTIONAL: 'c' for computer, 'h' for human. 
 	def get_pieces_adjacent_to(self, start, piece_type=None):
-		explosion_range = [
-			start, 						# Middle (start==end. Same thing.)
-			(start[0]-1,start[1]), 		# North
-			(start[0]-1,start[1]+1),	# NorthEast
-			(start[0],start[1]+1),		# East
-			(start[0]+1,start[1]+1),	# SouthEast
-			(start[0]+1,start[1]),		# South
-			(start[0]+1,start[1]-1),	# SouthWest
-			(start[0],start[1]-1),		# West
-			(start[0]-1,start[1]-1),	# NorthWest
-		]
-
-		exploded_pieces = []
-		for explosion_position in explosion_range:
-			# if the explosions are not valid... skip them.
-			if explosion_position[0] < 0 or explosion_position[0] > 8 or explosion_position[1] < 0 or explosion_position[1] > 6:
-				continue
-			if self.board[explosion_position[0]][explosion_position[1]] == '-':
-				continue
-			
-			exploded_pieces.append(self.board[explosion_position[0]][explosion_position[1]])
-
 		if not piece_type:
-			return exploded_pieces
-		elif piece_type == 'c':
-			return filter(lambda piece: piece.isupper(), exploded_pieces)
-		elif piece_type == 'h':
-			return filter(lambda piece: piece.islower(), exploded_pieces)
+			occupied = self.occupied['h'] | self.occupied['c']
+		elif piece_type in self.occupied:
+			occupied = self.occupied[piece_type]
 		else:
 			return []
 
+		adjacent = explosion_masks[self.indexed_board[start[0]][start[1]]] & occupied
+		exploded_pieces = []
+		while adjacent:
+			bit = adjacent & -adjacent
+			adjacent ^= bit
+			row, col = divmod(bit.bit_length() - 1, self.columns)
+			exploded_pieces.append(self.board[row][col])
+		return exploded_pieces
+
 	def move(self, piece, start, end):
-		# Add this board state to the stack.
-		self.move_stack.append(deepcopy(self.board))
+		return self.make_move(encode_move(piece, self.indexed_board[start[0]][start[1]], self.indexed_board[end[0]][end[1]]))
 
+	# Makes a move packed by move_encoding.encode_move().
+	def make_move(self, move):
+		piece = move_pieces[move >> 12 & 15]
+		start_index = move & 63
+		end_index = move >> 6 & 63
+		zobrist_hash = self.zobrist_hash
+		evaluation = self.evaluation
 		total_exploded = 0
 		captured_piece = None
 
 		# It's an explosion...
-		if start[0] == end[0] and start[1] == end[1]:
-			explosion_range = [
-				start, 						# Middle (start==end. Same thing.)
-				(start[0]-1,start[1]), 		# North
-				(start[0]-1,start[1]+1),	# NorthEast
-				(start[0],start[1]+1),		# East
-				(start[0]+1,start[1]+1),	# SouthEast
-				(start[0]+1,start[1]),		# South
-				(start[0]+1,start[1]-1),	# SouthWest
-				(start[0],start[1]-1),		# West
-				(start[0]-1,start[1]-1),	# NorthWest
-			]
-
-			for explosion_position in explosion_range:
-				# if the explosions are not valid... skip them.
-				if explosion_position[0] < 0 or explosion_position[0] > 8 or explosion_position[1] < 0 or explosion_position[1] > 6:
-					continue
-				if self.board[explosion_position[0]][explosion_position[1]] == '-':
-					continue
-				
-				exploded_piece = self.board[explosion_position[0]][explosion_position[1]]
-				self.board[explosion_position[0]][explosion_position[1]] = '-'
+		if start_index == end_index:
+			exploded_mask = explosion_masks[start_index] & (self.occupied['h'] | self.occupied['c'])
+			exploded_pieces = ""
+
+			exploded = exploded_mask
+			while exploded:
+				bit = exploded & -exploded
+				exploded ^= bit
+				index = bit.bit_length() - 1
+				row, col = divmod(index, self.columns)
+				exploded_piece = self.board[row][col]
+				self.bitboards[exploded_piece] ^= bit
+				self.occupied['c' if exploded_piece.isupper() else 'h'] ^= bit
+				self.zobrist_hash ^= zobrist_keys[exploded_piece][index]
+				self.evaluation -= square_scores[exploded_piece][index] + self.get_adjacency_score(exploded_piece, index)
+				self.board[row][col] = '-'
+				exploded_pieces += exploded_piece
 				
 				total_exploded += 1
-				
-			if total_exploded > 0:
-				pass
-				# print("boom.")
+
+			# Add the undo record to the stack.
+			self.move_stack.append((piece, start_index, start_index, None, exploded_mask, exploded_pieces, zobrist_hash, evaluation))
 
 		else: # Normal move, no explosion.
-			if self.board[end[0]][end[1]] != "-":
-				captured_piece = self.board[end[0]][end[1]]
+			start_row, start_col = divmod(start_index, self.columns)
+			end_row, end_col = divmod(end_index, self.columns)
+			end_bit = 1 << end_index
+			if self.board[end_row][end_col] != "-":
+				captured_piece = self.board[end_row][end_col]
+				self.bitboards[captured_piece] ^= end_bit
+				self.occupied['c' if captured_piece.isupper() else 'h'] ^= end_bit
+				self.zobrist_hash ^= zobrist_keys[captured_piece][end_index]
+				self.evaluation -= square_scores[captured_piece][end_index] + self.get_adjacency_score(captured_piece, end_index)
+
+			move_bits = (1 << start_index) | end_bit
+			self.evaluation -= square_scores[piece][start_index] + self.get_adjacency_score(piece, start_index)
+			self.bitboards[piece] ^= move_bits
+			self.occupied['c' if piece.isupper() else 'h'] ^= move_bits
+			self.zobrist_hash ^= zobrist_keys[piece][start_index] ^ zobrist_keys[piece][end_index]
+			self.evaluation += square_scores[piece][end_index] + self.get_adjacency_score(piece, end_index)
+
+			self.board[start_row][start_col] = "-"
+			self.board[end_row][end_col] = piece
 
-			self.board[start[0]][start[1]] = "-"
-			self.board[end[0]][end[1]] = piece
+			# Add the undo record to the stack.
+			self.move_stack.append((piece, start_index, end_index, captured_piece, 0, "", zobrist_hash, evaluation))
 
 		# Returns whether or not there was an exploded piece and whether or not there was a capture.
 		return (total_exploded > 0, captured_piece is not None)
@@ -0,0 +1,87 @@
+# Material scores for the evaluation function.
+# This determines the weight for each peice.
+material = {
+    'p': 100,
+    'n': 300,
+    'b': 300,
+    'r': 500,
+    'k': 20000
+}
+
+# Piece square table scores for the evaluation function.
+# This determines the score of a piece at in a certain location.
+piece_square_tables = {
+    'p':
+        [
+            [  0,  0,   0,  0,   0,  0,  0], 
+            [  0,  0,   0,  0,   0,  0,  0], 
+            [  0,  0,   0,  0,   0,  0,  0], 
+            [-10,  0, -10,  0, -10,  0,-10], 
+            [  5, 10,  20, 20,  20, 20,  5], 
+            [ 10, 20,  20, 20,  20, 20, 10], 
+            [  0,  0,   0,  0,   0,  0,  0], 
+            [  0,  0,   0,  0,   0,  0,  0], 
+            [  0,  0,   0,  0,   0,  0,  0], 
+        ],
+    'n':
+        [
+            [-50, -40, -30, -30, -30, -40, -50],
+            [-40, -20,   0,   0,   0, -20, -40],
+            [-30,  10,  10,  15,  10,  10, -30],
+            [-30,  10,  40,  40,  40,  10, -30],
+            [-30,  10,  40,  40,  40,  10, -30],
+            [-30,  10,  40,  40,  40,  10, -30],
+            [-30,  10,  10,  10,  10,  10, -30],
+            [-40, -20,   0,   0,   0, -20, -40], 
+            [-50, -40, -30, -30, -30, -40, -50], 
+        ],
+    'b':
+        [
+            [-20, -10, -10, -10, -10, -10, -20],
+            [-10,   0,   0,   0,   0,   0, -10],
+            [-10,   0,  10,  20,  10,   0, -10],
+            [-10,  10,  10,  20,  10,  10, -10],
+            [-10,  10,  20,  20,  20,  10, -10],
+            [-10,   0,  20,  20,  20,   0, -10],
+            [-10,  20,  20,  20,  20,  20, -10],
+            [-10,  10,   0,   0,   0,  10, -10],
+            [-20, -10, -10, -10, -10, -10, -20],
+        ],
+    'r':
+        [
+            [ 0,  0,  0,  0,  0,  0,  0],
+            [-5,  0,  0,  0,  0,  0, -5],
+            [-5,  0,  0,  0,  0,  0, -5],
+            [-5,  0,  0,  0,  0,  0, -5],
+            [-5,  0,  0,  0,  0,  0, -5],
+            [-5,  0,  0,  0,  0,  0, -5],
+            [-5, 10, 10, 10, 10, 10, -5],
+            [ 5, 20, 20, 20, 20, 20,  5],
+            [ 0,  0,  0,  0,  0,  0,  0],
+        ],
+    'k':
+        [
+            [ 20,  30,  30,  40,  30,  30,  20],
+            [ 20,  20,  30,  30,  30,  20,  20],
+            [ -5, -15, -15, -20, -15, -15,  -5],
+            [-10, -20, -20, -30, -20, -20, -10],
+            [-20, -30, -30, -40, -30, -30, -20],
+            [-30, -40, -40, -50, -40, -40,   0],
+            [-30, -40, -40, -50, -40, -40,   0],
+            [-30, -40, -40, -50, -40, -40,   0],
+            [-30, -40, -40, -50, -40, -40,   0]
+        ]
+}
+
+# Evaluation of every piece on every board index, from the bot's point of view.
+# square_scores[<piece>][<index>] is the piece's material plus its piece square table score.
+# The human's piece square tables are the bot's, upside down, and count against the bot.
+def generate_square_scores():
+    scores = {}
+    for piece_type, piece_square_table in piece_square_tables.items():
+        flipped_piece_square_table = piece_square_table[::-1]
+        scores[piece_type.upper()] = [material[piece_type] + piece_square_table[index // 7][index % 7] for index in range(63)]
+        scores[piece_type] = [-(material[piece_type] + flipped_piece_square_table[index // 7][index % 7]) for index in range(63)]
+    return scores
+
+square_scores = generate_square_scores()
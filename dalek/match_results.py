@@ -0,0 +1,76 @@
+import math
+
+# Results of a match between engine A and engine B, from A's point of view, with the Elo difference they point
+# to and a sequential probability ratio test (SPRT) to stop the match as soon as the results are clear enough.
+# The SPRT tests whether A is elo1 stronger than B (H1) rather than elo0 stronger (H0), making the wrong call
+# with a chance of at most alpha when H0 holds, and beta when H1 holds.
+# It uses the normal approximation of the log-likelihood ratio over the score of every game.
+class MatchResults:
+    # Draws added to the results for the score and its variance, so a match where one engine wins (or loses)
+    # every game still has a variance, and gets a verdict and an Elo margin.
+    pseudo_draws = 0.5
+
+    def __init__(self, elo0=0.0, elo1=5.0, alpha=0.05, beta=0.05):
+        self.elo0 = elo0
+        self.elo1 = elo1
+        self.lower_bound = math.log(beta / (1 - alpha))
+        self.upper_bound = math.log((1 - beta) / alpha)
+        self.wins = 0
+        self.draws = 0
+        self.losses = 0
+
+    # @param score: 1 if A won, 0.5 for a draw, 0 if A lost.
+    def add(self, score):
+        if score == 1:
+            self.wins += 1
+        elif score == 0:
+            self.losses += 1
+        else:
+            self.draws += 1
+
+    def get_games(self):
+        return self.wins + self.draws + self.losses
+
+    # Average score of A, and its variance per game, with the pseudo_draws.
+    def get_score(self):
+        if not self.get_games():
+            return (0.5, 0.0)
+        draws = self.draws + self.pseudo_draws
+        games = self.wins + draws + self.losses
+        score = (self.wins + 0.5 * draws) / games
+        variance = (self.wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + self.losses * score ** 2) / games
+        return (score, variance)
+
+    # Returns tuple like (<Elo difference>, <95% confidence margin>), positive if A is stronger.
+    def get_elo(self):
+        score, variance = self.get_score()
+        games = self.get_games()
+        margin = 1.96 * math.sqrt(variance / (games + self.pseudo_draws)) if games else 0.0
+        elo = get_elo_difference(score)
+        return (elo, (get_elo_difference(score + margin) - get_elo_difference(score - margin)) / 2)
+
+    def get_log_likelihood_ratio(self):
+        score, variance = self.get_score()
+        if variance == 0:
+            return 0.0
+        expected_score0 = get_expected_score(self.elo0)
+        expected_score1 = get_expected_score(self.elo1)
+        return (self.get_games() + self.pseudo_draws) * (expected_score1 - expected_score0) * (2 * score - expected_score0 - expected_score1) / (2 * variance)
+
+    # 'H1' if A is elo1 stronger, 'H0' if it's not, or None while the results aren't clear yet.
+    def get_verdict(self):
+        log_likelihood_ratio = self.get_log_likelihood_ratio()
+        if log_likelihood_ratio >= self.upper_bound:
+            return 'H1'
+        if log_likelihood_ratio <= self.lower_bound:
+            return 'H0'
+        return None
+
+# Expected score of a player this many Elo stronger than its opponent.
+def get_expected_score(elo):
+    return 1 / (1 + 10 ** (-elo / 400.0))
+
+# Elo difference that gives this expected score. Capped for perfect scores.
+def get_elo_difference(score):
+    score = min(max(score, 0.001), 0.999)
+    return -400 * math.log10(1 / score - 1)
@@ -0,0 +1,32 @@
+# Moves are packed into one int, so generating, comparing and remembering them allocates nothing:
+# bits 0-5: <from index>
+# bits 6-11: <to index>, the same as <from index> for an explosion
+# bits 12-15: <piece>, its position in move_pieces
+# bit 16: CAPTURE, set if the move takes an enemy piece on <to index>
+# bit 17: EXPLOSION, set if the piece explodes on <from index>
+# Board indexes are row*7+col, like Board.indexed_board.
+# No move packs to 0, so NO_MOVE can stand for an empty slot.
+move_pieces = "bnrpkBNRPK"
+
+CAPTURE = 1 << 16
+EXPLOSION = 1 << 17
+NO_MOVE = 0
+
+# Piece bits of a move, ready to OR in.
+piece_codes = dict((piece, code << 12) for code, piece in enumerate(move_pieces))
+
+def encode_move(piece, from_index, to_index, flags=0):
+    return from_index | to_index << 6 | piece_codes[piece] | flags
+
+# Returns tuple like (<piece>, <from index>, <to index>).
+def decode_move(move):
+    return (move_pieces[move >> 12 & 15], move & 63, move >> 6 & 63)
+
+def get_move_piece(move):
+    return move_pieces[move >> 12 & 15]
+
+def get_move_from(move):
+    return move & 63
+
+def get_move_to(move):
+    return move >> 6 & 63
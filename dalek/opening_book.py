@@ -0,0 +1,69 @@
+import mmap
+import os
+import struct
+
+# Opening book file: a header, then one fixed size record per board state, sorted by state hash,
+# so a board state can be found by binary search without reading the whole file.
+# Header: <magic>, <number of records>
+# Record: <state hash>, <best move>, <evaluation>
+# where <state hash> is Board.get_state_hash() and <best move> is packed by move_encoding.encode_move().
+header_format = struct.Struct('<8sQ')
+record_format = struct.Struct('<QIi')
+book_magic = b'DALEKBK1'
+
+# Where the bot looks for its opening book unless told otherwise.
+default_book_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'opening_book.bin')
+
+# Writes the entries to a book file.
+# @param entries: dict like {<state hash>: (<best move>, <evaluation>)}
+def write_book(path, entries):
+    with open(path, 'wb') as book_file:
+        book_file.write(header_format.pack(book_magic, len(entries)))
+        for state_hash in sorted(entries):
+            best_move, evaluation = entries[state_hash]
+            book_file.write(record_format.pack(state_hash, best_move, int(evaluation)))
+
+# Read only view of a book file. The file is memory-mapped the first time it's probed, so it costs
+# nothing until then, and processes probing the same book share its pages through the page cache.
+# A missing book file is an empty book.
+class OpeningBook:
+    def __init__(self, path=default_book_path):
+        self.path = path
+        self.book_map = None
+        self.size = None
+
+    def open(self):
+        self.size = 0
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb') as book_file:
+            if os.fstat(book_file.fileno()).st_size < header_format.size:
+                raise ValueError("Bad opening book: {path}".format(path=self.path))
+            # The map stays valid after the file is closed.
+            self.book_map = mmap.mmap(book_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, size = header_format.unpack_from(self.book_map, 0)
+        if magic != book_magic or len(self.book_map) != header_format.size + size * record_format.size:
+            raise ValueError("Bad opening book: {path}".format(path=self.path))
+        self.size = size
+
+    def close(self):
+        if self.book_map is not None:
+            self.book_map.close()
+        self.book_map = None
+        self.size = None
+
+    # Returns tuple like (<best move>, <evaluation>) for this state hash, or None.
+    def probe(self, state_hash):
+        if self.size is None:
+            self.open()
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            record_hash, best_move, evaluation = record_format.unpack_from(self.book_map, header_format.size + middle * record_format.size)
+            if record_hash == state_hash:
+                return (best_move, evaluation)
+            if record_hash < state_hash:
+                low = middle + 1
+            else:
+                high = middle
+        return None
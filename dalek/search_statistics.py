@@ -0,0 +1,111 @@
+import sys
+from time_manager import clock
+
+# Peak memory isn't available everywhere.
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Numbers about one search, gathered while minimax_start() searches with statistics on.
+# The search functions are swapped for instrumented ones only while there's a SearchStatistics to fill in,
+# so the search costs nothing extra when the statistics are off.
+class SearchStatistics:
+    def __init__(self):
+        self.nodes = 0
+        self.qnodes = 0
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.tt_cutoffs = 0
+        self.tt_occupancy = 0.0
+        # cutoffs_by_move_index[<n>] is how many beta-cutoffs the <n>th move picked produced, 0 being the first.
+        self.cutoffs_by_move_index = {}
+        # Seconds spent in, and calls made to, every function timed with time_calls().
+        self.times = {}
+        self.calls = {}
+        self.time = 0.0
+
+    # Wraps the function so every call gets counted and timed under this name.
+    def time_calls(self, function, name):
+        self.times.setdefault(name, 0.0)
+        self.calls.setdefault(name, 0)
+        def timed_function(*args, **kwargs):
+            start_time = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.times[name] += clock() - start_time
+                self.calls[name] += 1
+        return timed_function
+
+    # Wraps the quiescence search so every node of it gets counted.
+    def count_qnodes(self, quiescence):
+        def counted_quiescence(*args, **kwargs):
+            self.qnodes += 1
+            return quiescence(*args, **kwargs)
+        return counted_quiescence
+
+    # Wraps pick_moves() so the moves it yields get counted, for count_cutoff().
+    def count_picked_moves(self, pick_moves):
+        def counted_pick_moves(*args, **kwargs):
+            return PickedMoves(pick_moves(*args, **kwargs))
+        return counted_pick_moves
+
+    # Call on a beta-cutoff, with the moves being searched when it happened.
+    def count_cutoff(self, picked_moves):
+        move_index = picked_moves.picked - 1
+        self.cutoffs_by_move_index[move_index] = self.cutoffs_by_move_index.get(move_index, 0) + 1
+
+    # Call when the search is over, to collect the numbers the time manager and the transposition table kept.
+    def finish(self, time_manager, transposition_table):
+        self.nodes = time_manager.nodes - self.qnodes
+        self.time = time_manager.get_elapsed()
+        self.tt_probes = transposition_table.probes
+        self.tt_hits = transposition_table.hits
+        self.tt_occupancy = transposition_table.get_occupancy()
+
+    # Peak memory of this process in kilobytes, or None if it's unknown.
+    def get_peak_memory(self):
+        if resource is None:
+            return None
+        peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS reports bytes, Linux kilobytes.
+        return peak_memory // 1024 if sys.platform == 'darwin' else peak_memory
+
+    # Returns the numbers as a dict, ready for json.dumps().
+    def get_report(self):
+        cutoffs = sum(self.cutoffs_by_move_index.values())
+        report = {
+            'nodes': self.nodes,
+            'qnodes': self.qnodes,
+            'time': round(self.time, 4),
+            'nps': int((self.nodes + self.qnodes) / self.time) if self.time > 0 else 0,
+            'tt_probes': self.tt_probes,
+            'tt_hits': self.tt_hits,
+            'tt_cutoffs': self.tt_cutoffs,
+            'tt_occupancy': round(self.tt_occupancy, 4),
+            'cutoffs_by_move_index': dict((str(move_index), count) for move_index, count in self.cutoffs_by_move_index.items()),
+            'first_move_cutoff_rate': round(self.cutoffs_by_move_index.get(0, 0) / float(cutoffs), 4) if cutoffs else None,
+            'peak_memory_kb': self.get_peak_memory()
+        }
+        for name in self.times:
+            report[name + '_time'] = round(self.times[name], 4)
+            report[name + '_calls'] = self.calls[name]
+        return report
+
+# Iterates the moves pick_moves() yields, counting them.
+class PickedMoves:
+    def __init__(self, moves):
+        self.moves = moves
+        self.picked = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        move = next(self.moves)
+        self.picked += 1
+        return move
+
+    # Python 2 name of __next__.
+    next = __next__
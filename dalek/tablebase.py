@@ -0,0 +1,160 @@
+import itertools
+import mmap
+import os
+
+# Endgame tablebases: the outcome of every board state with a few pieces left, solved once, offline.
+# There's one file per set of pieces, its signature, i.e. "KRk" for the bot's king and rook against the human's king.
+# The file is a header, then one byte per board state, at its index from get_signature_and_index().
+# The byte is the outcome for the player moving, in plies until the game's over:
+# <n> > 0: wins in <n> plies
+# <n> < 0: loses in -<n> - 1 plies, -1 meaning the other player won with the move that got here
+# 0: neither player can win
+tablebase_magic = b'DALEKTB2'
+
+# Pieces of a signature are in this order, the bot's first.
+piece_order = "KBNRPkbnrp"
+piece_ranks = dict((piece, rank) for rank, piece in enumerate(piece_order))
+
+# Where the bot looks for its tablebases unless told otherwise.
+default_tablebase_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tablebases')
+
+# Outcome of the board state from the outcome of the board state after the best move, both for the player moving.
+def get_parent_outcome(outcome):
+    if outcome > 0:
+        return -outcome - 2
+    if outcome < 0:
+        return -outcome
+    return 0
+
+# Whether the player moving would rather have outcome than other_outcome.
+# Quicker wins first, then draws, then slower losses.
+def is_better_outcome(outcome, other_outcome):
+    if outcome > 0:
+        return other_outcome <= 0 or outcome < other_outcome
+    if outcome == 0:
+        return other_outcome < 0
+    return other_outcome < 0 and outcome < other_outcome
+
+# binomials[<n>][<k>] is n choose k, for as many pieces as a board can hold.
+binomials = [[0] * 64 for _ in range(64)]
+for n in range(64):
+    binomials[n][0] = 1
+    for k in range(1, n + 1):
+        binomials[n][k] = binomials[n-1][k-1] + binomials[n-1][k]
+
+# Yields tuples like (<piece>, <number of them>) for the pieces of a signature, in signature order.
+def get_piece_groups(signature):
+    for piece, pieces in itertools.groupby(signature):
+        yield (piece, len(list(pieces)))
+
+# @param piece_indices: list like [(<piece>, <index>)...] of every piece on the board.
+# Returns tuple like (<signature>, <index>) where <index> is the board state's slot in the signature's table.
+# The pieces are placed a kind at a time, in signature order. The pieces of a kind take some of the squares
+# the kinds before them left empty, numbered by the combinatorial number system, so no slot has two pieces
+# on one square, or the same pieces in another order. The last bit is whose move it is.
+def get_signature_and_index(piece_indices, humans_turn):
+    signature = ""
+    index = 0
+    # Board indexes of the kinds of pieces before this one, and of this kind.
+    placed_indices = []
+    placed_pieces = 0
+    kind_indices = []
+    kind_pieces = 0
+    combination = 0
+    kind_rank = None
+    for rank, piece_index in sorted([(piece_ranks[piece], piece_index) for piece, piece_index in piece_indices]):
+        if rank != kind_rank:
+            if kind_pieces:
+                index = index * binomials[63 - placed_pieces][kind_pieces] + combination
+                placed_indices += kind_indices
+                placed_pieces += kind_pieces
+                kind_indices = []
+                kind_pieces = 0
+                combination = 0
+            kind_rank = rank
+        # Numbered among the squares the kinds before left empty.
+        empty_index = piece_index
+        for placed_index in placed_indices:
+            if placed_index < piece_index:
+                empty_index -= 1
+        kind_indices.append(piece_index)
+        kind_pieces += 1
+        combination += binomials[empty_index][kind_pieces]
+        signature += piece_order[rank]
+    index = index * binomials[63 - placed_pieces][kind_pieces] + combination
+    return (signature, index * 2 + (1 if humans_turn else 0))
+
+# Number of board states a signature's table has slots for.
+def get_table_size(signature):
+    size = 2
+    position = 0
+    for piece, pieces in get_piece_groups(signature):
+        size *= binomials[63 - position][pieces]
+        position += pieces
+    return size
+
+def get_tablebase_path(directory, signature):
+    return os.path.join(directory, signature + ".tb")
+
+# Writes a table of outcomes, see get_signature_and_index().
+# @param outcomes: bytearray with one byte per board state, the outcome modulo 256.
+def write_tablebase(path, outcomes):
+    with open(path, 'wb') as tablebase_file:
+        tablebase_file.write(tablebase_magic)
+        tablebase_file.write(outcomes)
+
+# Read only view of the tablebase files in a directory. Every file gets memory-mapped the first time
+# it's probed, so only the pages the search touches get read, and processes share them.
+class Tablebases:
+    def __init__(self, directory=default_tablebase_directory):
+        self.directory = directory
+        self.tables = {}
+        self.signatures = set()
+        if os.path.isdir(directory):
+            self.signatures = set(name[:-3] for name in os.listdir(directory) if name.endswith(".tb"))
+        # Board states with more pieces than this aren't in any table.
+        self.max_pieces = max(len(signature) for signature in self.signatures) if self.signatures else 0
+
+    def open(self, signature):
+        path = get_tablebase_path(self.directory, signature)
+        with open(path, 'rb') as tablebase_file:
+            # The map stays valid after the file is closed.
+            table = mmap.mmap(tablebase_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if table[:len(tablebase_magic)] != tablebase_magic or len(table) != len(tablebase_magic) + get_table_size(signature):
+            table.close()
+            raise ValueError("Bad tablebase: {path}".format(path=path))
+        self.tables[signature] = table
+        return table
+
+    # Returns the outcome for the player moving, or None if there's no table for these pieces.
+    def probe(self, board_object, humans_turn):
+        signature, index = get_signature_and_index(board_object.get_piece_indices(), humans_turn)
+        if signature not in self.signatures:
+            return None
+        table = self.tables.get(signature) or self.open(signature)
+        outcome = ord(table[len(tablebase_magic) + index:len(tablebase_magic) + index + 1])
+        return outcome - 256 if outcome > 127 else outcome
+
+# Yields every placement of the pieces of a signature, like (<index>...) in signature order, the same pieces by
+# board index, ordered from the pieces furthest forward to the ones furthest back.
+# The bot's pieces move down the rows, the human's up.
+def generate_placements(signature):
+    def generate_advancements(pieces, total):
+        if pieces == 0:
+            if total == 0:
+                yield ()
+            return
+        for advancement in range(min(total, 8), -1, -1):
+            for advancements in generate_advancements(pieces - 1, total - advancement):
+                yield (advancement,) + advancements
+
+    for total in range(8 * len(signature), -1, -1):
+        for advancements in generate_advancements(len(signature), total):
+            rows = [advancement if piece.isupper() else 8 - advancement for piece, advancement in zip(signature, advancements)]
+            for columns in itertools.product(range(7), repeat=len(signature)):
+                indices = tuple(row * 7 + column for row, column in zip(rows, columns))
+                if len(set(indices)) != len(indices):
+                    continue
+                if any(signature[position] == signature[position+1] and indices[position] > indices[position+1] for position in range(len(signature) - 1)):
+                    continue
+                yield indices
@@ -0,0 +1,142 @@
+import time
+
+# Python 2 doesn't have a monotonic clock, fall back to the wall clock there.
+clock = getattr(time, 'monotonic', time.time)
+
+# Raised from inside the search when its budget runs out.
+class TimesUpException(Exception):
+    pass
+
+# Decides how long the bot can think about a move, and stops the search when that's up.
+# @param movetime OPTIONAL: seconds to think about every move.
+# @param time_left OPTIONAL: seconds left on the bot's clock for the rest of the game.
+# @param increment OPTIONAL: seconds added to the bot's clock after each of its moves.
+# @param moves_to_go OPTIONAL: moves left until the clock gets more time. Unknown if None.
+# @param depth OPTIONAL: deepest iteration to search.
+# @param nodes OPTIONAL: most nodes to search per move.
+# @param infinite OPTIONAL: search until abort() is called, unless another budget runs out first.
+# With no budget at all, the bot thinks for 5 seconds per move.
+class TimeManager:
+    # When the moves left are unknown, plan as if this many were left.
+    default_moves_to_go = 30
+
+    # Seconds kept on the clock for the overhead between moves.
+    safety_margin = 0.05
+
+    def __init__(self, movetime=None, time_left=None, increment=0, moves_to_go=None, depth=None, nodes=None, infinite=False, poll_interval=1024):
+        if movetime is None and time_left is None and depth is None and nodes is None and not infinite:
+            movetime = 5
+        self.movetime = movetime
+        self.time_left = time_left
+        self.increment = increment
+        self.moves_to_go = moves_to_go
+        self.depth = depth
+        self.node_limit = nodes
+        self.poll_interval = poll_interval
+
+        self.start_time = None
+        self.deadline = None
+        self.soft_deadline = None
+        self.nodes = 0
+        self.next_poll = 0
+        # Set from another thread to stop the search at its next poll.
+        self.aborted = False
+        # While pondering, the search runs on the opponent's time, without a deadline.
+        self.pondering = False
+        # Seconds the search pondered before ponder_hit(), not charged to the clock.
+        self.ponder_time = 0
+
+    # Seconds the next move can take, or None if it isn't limited by time.
+    def get_budget(self):
+        if self.movetime is not None:
+            return self.movetime
+        if self.time_left is None:
+            return None
+        moves_to_go = self.moves_to_go or self.default_moves_to_go
+        budget = self.time_left / float(moves_to_go) + self.increment
+        return max(0, min(budget, self.time_left - self.safety_margin))
+
+    # Call when the bot starts thinking about a move.
+    def start(self):
+        self.start_time = clock()
+        self.nodes = 0
+        self.ponder_time = 0
+        budget = self.get_budget()
+        if budget is None or self.pondering:
+            self.deadline = self.soft_deadline = None
+        else:
+            self.deadline = self.start_time + budget
+            # An iteration started after half the budget probably won't finish.
+            self.soft_deadline = self.start_time + budget/2.0
+        self.schedule_poll()
+
+    # Call when the bot made its move, to charge the time it took to its clock.
+    def stop(self):
+        if self.time_left is not None:
+            self.time_left = max(0, self.time_left - (self.get_elapsed() - self.ponder_time) + self.increment)
+            if self.moves_to_go:
+                self.moves_to_go -= 1
+
+    def get_elapsed(self):
+        return clock() - self.start_time
+
+    def schedule_poll(self):
+        self.next_poll = self.nodes + self.poll_interval
+        if self.node_limit is not None:
+            self.next_poll = min(self.next_poll, self.node_limit)
+
+    # Call once per node. Only looks at the clock every poll_interval nodes.
+    def check(self):
+        self.nodes += 1
+        if self.nodes >= self.next_poll:
+            if self.is_time_up():
+                raise TimesUpException()
+            self.schedule_poll()
+
+    # Stops the search, e.g. when asked to from another thread. It stops within poll_interval nodes.
+    def abort(self):
+        self.aborted = True
+
+    # Call before starting a search on the opponent's time, on the move the opponent is expected to play.
+    # The search runs until ponder_hit() or abort().
+    def ponder(self):
+        self.pondering = True
+        self.aborted = False
+        self.start_time = None
+
+    # Call when the opponent played the expected move. From now on the search keeps to its budget,
+    # which starts counting now, but the search won't think for more than twice the budget in all,
+    # so after pondering for that long the pondered move gets played right away.
+    def ponder_hit(self):
+        self.pondering = False
+        # The search hasn't started yet, start() sets the deadlines as usual.
+        if self.start_time is None:
+            return
+        hit_time = clock()
+        self.ponder_time = hit_time - self.start_time
+        budget = self.get_budget()
+        if budget is not None:
+            self.deadline = min(hit_time + budget, self.start_time + 2*budget)
+            self.soft_deadline = min(hit_time + budget/2.0, self.start_time + budget)
+
+    # Call once an aborted search or a search pondering on the wrong move stopped, before the next search.
+    def reset(self):
+        self.aborted = False
+        self.pondering = False
+
+    def is_time_up(self):
+        if self.aborted:
+            return True
+        if self.node_limit is not None and self.nodes >= self.node_limit:
+            return True
+        return self.deadline is not None and clock() >= self.deadline
+
+    # Whether there's still time to start another iteration.
+    def can_start_iteration(self, depth):
+        if self.aborted:
+            return False
+        if self.depth is not None and depth > self.depth:
+            return False
+        if self.node_limit is not None and self.nodes >= self.node_limit:
+            return False
+        return self.soft_deadline is None or clock() < self.soft_deadline
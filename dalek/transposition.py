@@ -0,0 +1,273 @@
+import ctypes
+import mmap
+import multiprocessing
+import os
+import struct
+
+# Bound flags for transposition table entries.
+# EXACT: the evaluation is the true minimax value of the board state.
+# LOWER_BOUND: the search failed high, the true value is at least the evaluation.
+# UPPER_BOUND: the search failed low, the true value is at most the evaluation.
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+# Entries of SharedTranspositionTable and TranspositionCache are packed into one 64 bit data word:
+# bits 0-23: <evaluation> + 2**23
+# bits 24-29: <depth>
+# bits 30-31: <flag>
+# bits 32-37: <age> % 64
+# bits 38-55: <best_move>, packed by move_encoding.encode_move(), 0 if there isn't one
+# bits 56-59: <writer>, which process stored the entry, 0 for the main search.
+# A slot is two words: the state hash XOR the data, and the data. A slot written by two processes at once
+# ends up with a hash that doesn't match its data, so it reads as empty, without any locks.
+def pack_entry(depth, flag, evaluation, best_move, age, writer=0):
+    return (
+        (int(evaluation) + (1 << 23)) & 0xffffff
+        | min(depth, 63) << 24
+        | flag << 30
+        | age << 32
+        | best_move << 38
+        | min(writer, 15) << 56
+    )
+
+# Returns the entry like TranspositionTable entries from the data word.
+def unpack_entry(state_hash, data):
+    return (
+        state_hash,
+        (data >> 24) & 63,
+        (data >> 30) & 3,
+        (data & 0xffffff) - (1 << 23),
+        (data >> 38) & 0x3ffff,
+        (data >> 32) & 63
+    )
+
+# Fixed size table of searched board states, indexed by the low bits of their Zobrist hash.
+# Each slot holds one entry that looks like:
+# (<state_hash>, <depth>, <flag>, <evaluation>, <best_move>, <age>)
+# where <depth> is how many plies were searched below the board state.
+class TranspositionTable:
+    def __init__(self, size_bits=18):
+        self.size = 1 << size_bits
+        self.index_mask = self.size - 1
+        self.entries = [None] * self.size
+        self.age = 0
+        self.probes = 0
+        self.hits = 0
+
+    # Call at the start of every search so entries from older searches get replaced first.
+    def new_search(self):
+        self.age += 1
+        self.probes = 0
+        self.hits = 0
+
+    def clear(self):
+        self.entries = [None] * self.size
+        self.age = 0
+
+    # Fraction of the first sample slots holding an entry from this search.
+    def get_occupancy(self, sample=1000):
+        sample = min(sample, self.size)
+        return sum(1 for entry in self.entries[:sample] if entry is not None and entry[5] == self.age) / float(sample)
+
+    # Yields every entry stored during this search.
+    def get_entries(self):
+        for entry in self.entries:
+            if entry is not None and entry[5] == self.age:
+                yield entry
+
+    # Returns the entry for this state hash, or None.
+    def probe(self, state_hash):
+        self.probes += 1
+        entry = self.entries[state_hash & self.index_mask]
+        if entry is not None and entry[0] == state_hash:
+            self.hits += 1
+            return entry
+        return None
+
+    # Replaces the slot unless it holds a different board state that was searched deeper during this search.
+    def store(self, state_hash, depth, flag, evaluation, best_move):
+        index = state_hash & self.index_mask
+        entry = self.entries[index]
+        if entry is not None:
+            if entry[0] == state_hash:
+                # Don't forget the best move of a board state just because this search didn't find one.
+                if not best_move:
+                    best_move = entry[4]
+            elif entry[5] == self.age and entry[1] > depth:
+                return
+        self.entries[index] = (state_hash, depth, flag, evaluation, best_move, self.age)
+
+# Transposition table in shared memory, so processes forked after it's made can all use it.
+# Its slots are packed by pack_entry(), so there are no locks.
+# probe() and store() work like they do for TranspositionTable.
+class SharedTranspositionTable:
+    def __init__(self, size_bits=18):
+        self.size = 1 << size_bits
+        self.index_mask = self.size - 1
+        self.slots = multiprocessing.RawArray(ctypes.c_uint64, 2 * self.size)
+        self.age = 0
+        self.writer = 0
+        self.probes = 0
+        self.hits = 0
+        self.writer_hits = {}
+
+    # Call at the start of every search so entries from older searches get replaced first.
+    def new_search(self):
+        self.age = (self.age + 1) % 64
+        self.probes = 0
+        self.hits = 0
+        self.writer_hits = {}
+
+    def clear(self):
+        ctypes.memset(self.slots, 0, ctypes.sizeof(self.slots))
+        self.age = 0
+
+    # Hits on entries stored by other processes, i.e. the helpers of the main search.
+    def get_shared_hits(self):
+        return sum(hits for writer, hits in self.writer_hits.items() if writer != self.writer)
+
+    # Fraction of the first sample slots holding an entry from this search.
+    def get_occupancy(self, sample=1000):
+        sample = min(sample, self.size)
+        return sum(1 for index in range(sample) if self.slots[2*index + 1] and (self.slots[2*index + 1] >> 32) & 63 == self.age) / float(sample)
+
+    # Yields every entry stored during this search.
+    def get_entries(self):
+        for index in range(self.size):
+            data = int(self.slots[2*index + 1])
+            if data and (data >> 32) & 63 == self.age:
+                yield unpack_entry(int(self.slots[2*index]) ^ data, data)
+
+    # Returns the data word of the slot if it holds this state hash, or None.
+    def read(self, state_hash):
+        index = (state_hash & self.index_mask) << 1
+        data = int(self.slots[index + 1])
+        if data and self.slots[index] ^ data == state_hash:
+            return data
+        return None
+
+    # Returns the entry for this state hash, or None.
+    def probe(self, state_hash):
+        self.probes += 1
+        data = self.read(state_hash)
+        if data is None:
+            return None
+        self.hits += 1
+        writer = (data >> 56) & 15
+        self.writer_hits[writer] = self.writer_hits.get(writer, 0) + 1
+        return unpack_entry(state_hash, data)
+
+    # Replaces the slot unless it holds a different board state that was searched deeper during this search.
+    def store(self, state_hash, depth, flag, evaluation, best_move):
+        index = (state_hash & self.index_mask) << 1
+        old_data = self.slots[index + 1]
+        if old_data:
+            if self.slots[index] ^ old_data == state_hash:
+                # Don't forget the best move of a board state just because this search didn't find one.
+                if not best_move:
+                    best_move = (old_data >> 38) & 0x3ffff
+            elif (old_data >> 32) & 63 == self.age and (old_data >> 24) & 63 > depth:
+                return
+        data = pack_entry(depth, flag, evaluation, best_move, self.age, self.writer)
+        self.slots[index] = state_hash ^ data
+        self.slots[index + 1] = data
+
+# Where the bot keeps its transposition cache unless told otherwise.
+default_cache_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'transposition_cache.bin')
+
+# Transposition table in a file, so what one game searched is still there for the next one, or for another bot
+# running at the same time. The file is memory-mapped the first time it's used, so only the slots that get
+# probed are read, and every process sharing it writes to the same pages.
+# The file is a header, <magic>, <size_bits>, <generation>, then slots packed by pack_entry(), where <age> is the
+# generation of the save() that stored the entry. The size is fixed when the file is made, so it never grows.
+# A slot gets replaced by an entry searched at least as deep, or by any entry once it's stale.
+class TranspositionCache:
+    header_format = struct.Struct('<8sII')
+    slot_format = struct.Struct('<QQ')
+    magic = b'DALEKTT1'
+
+    # Entries stored this many saves before are stale.
+    stale_generations = 32
+
+    def __init__(self, path=default_cache_path, size_bits=20):
+        self.path = path
+        self.size_bits = size_bits
+        self.cache_map = None
+        self.probes = 0
+        self.hits = 0
+
+    # Makes the file if there isn't one. The file only appears once it's complete, so processes racing to make it
+    # either make it or find one that's ready.
+    def create(self):
+        temporary_path = "{path}.{process}.tmp".format(path=self.path, process=os.getpid())
+        with open(temporary_path, 'wb') as cache_file:
+            cache_file.write(self.header_format.pack(self.magic, self.size_bits, 0))
+            cache_file.truncate(self.header_format.size + self.slot_format.size * (1 << self.size_bits))
+        try:
+            os.link(temporary_path, self.path)
+        except OSError:
+            pass
+        finally:
+            os.remove(temporary_path)
+
+    def open(self):
+        if not os.path.exists(self.path):
+            self.create()
+        with open(self.path, 'r+b') as cache_file:
+            # The map stays valid after the file is closed.
+            self.cache_map = mmap.mmap(cache_file.fileno(), 0, access=mmap.ACCESS_WRITE)
+        if len(self.cache_map) < self.header_format.size:
+            raise ValueError("Bad transposition cache: {path}".format(path=self.path))
+        magic, self.size_bits, _ = self.header_format.unpack_from(self.cache_map, 0)
+        if magic != self.magic or len(self.cache_map) != self.header_format.size + self.slot_format.size * (1 << self.size_bits):
+            raise ValueError("Bad transposition cache: {path}".format(path=self.path))
+        self.index_mask = (1 << self.size_bits) - 1
+
+    def close(self):
+        if self.cache_map is not None:
+            self.cache_map.close()
+        self.cache_map = None
+
+    def get_slot_offset(self, state_hash):
+        return self.header_format.size + self.slot_format.size * (state_hash & self.index_mask)
+
+    # Returns the entry for this state hash, like TranspositionTable.probe(), or None.
+    def probe(self, state_hash):
+        if self.cache_map is None:
+            self.open()
+        self.probes += 1
+        checksum, data = self.slot_format.unpack_from(self.cache_map, self.get_slot_offset(state_hash))
+        if not data or checksum ^ data != state_hash:
+            return None
+        self.hits += 1
+        return unpack_entry(state_hash, data)
+
+    # Stores every entry of the transposition table from the search that just finished, searched at least min_depth deep.
+    # Returns how many got stored.
+    def save(self, transposition_table, min_depth=0):
+        if self.cache_map is None:
+            self.open()
+        # Other processes might save at the same time. At worst they end up with the same generation.
+        generation = (self.header_format.unpack_from(self.cache_map, 0)[2] + 1) % (1 << 32)
+        self.header_format.pack_into(self.cache_map, 0, self.magic, self.size_bits, generation)
+        age = generation % 64
+
+        stored = 0
+        for state_hash, depth, flag, evaluation, best_move, _ in transposition_table.get_entries():
+            if depth < min_depth:
+                continue
+            offset = self.get_slot_offset(state_hash)
+            checksum, old_data = self.slot_format.unpack_from(self.cache_map, offset)
+            if old_data:
+                if checksum ^ old_data == state_hash:
+                    # Don't forget the best move of a board state just because this search didn't find one.
+                    if not best_move:
+                        best_move = (old_data >> 38) & 0x3ffff
+                if (age - ((old_data >> 32) & 63)) % 64 < self.stale_generations and (old_data >> 24) & 63 > depth:
+                    continue
+            data = pack_entry(depth, flag, evaluation, best_move, age)
+            self.slot_format.pack_into(self.cache_map, offset, state_hash ^ data, data)
+            stored += 1
+        self.cache_map.flush()
+        return stored